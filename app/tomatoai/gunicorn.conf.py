@@ -0,0 +1,92 @@
+"""
+Gunicorn configuration for the production runtime profile.
+
+    gunicorn -c gunicorn.conf.py
+
+The worker model is chosen with GUNICORN_WORKER_CLASS:
+
+- 'sync' (default): WSGI application, 2 * CPU + 1 processes.
+- 'uvicorn.workers.UvicornWorker': ASGI application, one process per CPU.
+"""
+
+import multiprocessing
+import os
+
+cpu = multiprocessing.cpu_count()
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+asgi = worker_class.startswith('uvicorn')
+
+if asgi:
+    wsgi_app = 'tomatoai.asgi:application'
+    workers_default = cpu
+else:
+    wsgi_app = 'tomatoai.wsgi:application'
+    workers_default = 2 * cpu + 1
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', workers_default))
+
+# Load Django once in the master so that workers share the imported code
+# through copy-on-write and start immediately.
+preload_app = True
+
+# Recycle workers periodically to bound memory growth.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+
+raw_env = [
+    'DJANGO_SETTINGS_MODULE=' + os.environ.get('DJANGO_SETTINGS_MODULE', 'tomatoai.settings_prod'),
+]
+
+# Persistent connections are not reused under ASGI, Django closes them at the
+# end of each request anyway.
+if asgi:
+    raw_env.append('DJANGO_CONN_MAX_AGE=' + os.environ.get('DJANGO_CONN_MAX_AGE', '0'))
+
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', None)
+
+# Opt-in: preloading the in-memory indexes scans the link tables on every cold
+# start, which slows down scaling out.
+preload_indexes = os.environ.get('GUNICORN_PRELOAD_INDEXES', '0') == '1'
+
+
+def when_ready(server):
+    # The app is preloaded in the master: load the URLconf here as well, so that
+    # views, serializers and the rest of DRF are inherited by every worker
+    # instead of being imported on each worker's first request.
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+
+    if preload_indexes:
+        _preload_indexes(server)
+
+
+def _preload_indexes(server):
+    # Build the in-memory similarity index and analytics rankings once, before
+    # forking: every worker inherits them instead of answering 503 while building
+    # its own copy. A failure (e.g. database unreachable or not migrated) must not
+    # stop the server: the workers build them on demand.
+    from django.db import connections
+
+    from restaurant_manager.analisi import prepara_classifiche
+    from restaurant_manager.similarita import prepara_indice
+
+    for name, prepare in (('similarity index', prepara_indice), ('analytics rankings', prepara_classifiche)):
+        try:
+            prepare()
+        except Exception:
+            server.log.exception('Could not preload the %s, workers will build it on demand', name)
+        finally:
+            connections.close_all()
+
+
+def post_fork(server, worker):
+    # No connection opened by the master during preload may be shared with workers
+    from django.db import connections
+
+    connections.close_all()
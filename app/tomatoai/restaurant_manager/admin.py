@@ -1,6 +1,128 @@
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelectMultiple
+from django.core.paginator import Paginator
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
 
 from .models import Ristorante, Ricetta, Ingrediente
+from .ricerche import Prefisso  # noqa: F401 (registra il lookup 'prefisso')
+from .stime import stima_righe
 
-# Register your models here.
-admin.site.register([Ristorante, Ricetta, Ingrediente])
\ No newline at end of file
+
+class StimaPaginator(Paginator):
+    """
+    Paginator che non conta mai l'intera tabella: senza filtri usa la stima
+    delle statistiche del database, con i filtri conta al massimo LIMITE righe.
+    """
+    LIMITE = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+
+        if not queryset.query.has_filters():
+            stima = stima_righe(queryset.model)
+            if stima is not None and stima > self.LIMITE:
+                return stima
+
+        return queryset.order_by()[:self.LIMITE].count()
+
+
+def conteggio_collegamenti(campo, lato):
+    """
+    Sottoquery correlata che conta i collegamenti ManyToMany di ogni riga.
+    A differenza di Count() con JOIN e GROUP BY sull'intera tabella, viene
+    valutata solo per le righe della pagina mostrata.
+
+    `lato` e' il nome del campo del modello intermedio che punta alla riga.
+    """
+    through = campo.remote_field.through
+    conteggi = (through.objects
+                .filter(**{lato: OuterRef('pk')})
+                .order_by()
+                .values(lato)
+                .annotate(numero=Count('*'))
+                .values('numero'))
+    return Coalesce(Subquery(conteggi, output_field=IntegerField()), 0)
+
+
+class CatalogoAdmin(admin.ModelAdmin):
+    """
+    Le ricerche usano il lookup 'prefisso' (vedi ricerche.py) invece di '^':
+    distinguono maiuscole e minuscole, ma usano l'indice della colonna invece di
+    scansionare la tabella.
+    """
+    paginator = StimaPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+    # Annotazioni da aggiungere al queryset della lista: nome -> (campo, lato)
+    conteggi = {}
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        # L'admin non mostra i ManyToMany con un modello intermedio esplicito, ma i
+        # nostri (vedi models.RicettaIngrediente) non hanno campi aggiuntivi e si
+        # salvano con .set() come quelli automatici
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs['widget'] = AutocompleteSelectMultiple(db_field, self.admin_site, using=kwargs.get('using'))
+            return db_field.formfield(**kwargs)
+
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+
+        return queryset.annotate(**{
+            nome: conteggio_collegamenti(campo, lato)
+            for nome, (campo, lato) in self.conteggi.items()
+        })
+
+
+@admin.register(Ristorante)
+class RistoranteAdmin(CatalogoAdmin):
+    list_display = ['nome', 'indirizzo', 'numero_ricette']
+    search_fields = ['nome__prefisso', 'indirizzo__prefisso']
+    autocomplete_fields = ['ricette']
+
+    conteggi = {
+        'numero_ricette': (Ristorante._meta.get_field('ricette'), 'ristorante'),
+    }
+
+    @admin.display(description='ricette')
+    def numero_ricette(self, obj):
+        return obj.numero_ricette
+
+
+@admin.register(Ricetta)
+class RicettaAdmin(CatalogoAdmin):
+    list_display = ['nome', 'numero_ingredienti', 'numero_ristoranti']
+    search_fields = ['nome__prefisso']
+    autocomplete_fields = ['ingredienti']
+
+    conteggi = {
+        'numero_ingredienti': (Ricetta._meta.get_field('ingredienti'), 'ricetta'),
+        'numero_ristoranti': (Ristorante._meta.get_field('ricette'), 'ricetta'),
+    }
+
+    @admin.display(description='ingredienti')
+    def numero_ingredienti(self, obj):
+        return obj.numero_ingredienti
+
+    @admin.display(description='ristoranti')
+    def numero_ristoranti(self, obj):
+        return obj.numero_ristoranti
+
+
+@admin.register(Ingrediente)
+class IngredienteAdmin(CatalogoAdmin):
+    list_display = ['nome', 'produttore', 'numero_ricette']
+    search_fields = ['nome__prefisso', 'produttore__prefisso']
+
+    conteggi = {
+        'numero_ricette': (Ricetta._meta.get_field('ingredienti'), 'ingrediente'),
+    }
+
+    @admin.display(description='ricette')
+    def numero_ricette(self, obj):
+        return obj.numero_ricette
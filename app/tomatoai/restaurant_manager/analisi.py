@@ -0,0 +1,361 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+
+from .models import Ristorante, Ricetta, Ingrediente, Modifica
+from .modifiche import cursore_sicuro
+
+# Secondi dopo i quali le classifiche vengono ricalcolate da zero, in un thread
+# separato, per correggere eventuali derive degli aggiornamenti incrementali
+RICALCOLO_PREDEFINITO = 3600
+
+
+class Classifica:
+    """
+    Conteggi per chiave che variano di una unita' alla volta, raggruppati per
+    valore: le chiavi con lo stesso conteggio stanno nello stesso gruppo e i
+    conteggi presenti sono tenuti ordinati. Le prime k si leggono scorrendo i
+    gruppi dal conteggio piu' alto, senza ordinare tutte le chiavi, e restano in
+    cache fino alla variazione successiva.
+
+    Le chiavi con conteggio zero non compaiono nella classifica.
+    """
+
+    def __init__(self):
+        self.conteggi = {}
+        self._gruppi = {}
+        self._livelli = []
+        self._prime = {}
+
+    def varia(self, chiave, delta):
+        self._prime.clear()
+
+        prima = self.conteggi.get(chiave, 0)
+        dopo = prima + delta
+        if prima:
+            self._esci(chiave, prima)
+        if dopo:
+            self.conteggi[chiave] = dopo
+            self._entra(chiave, dopo)
+        else:
+            self.conteggi.pop(chiave, None)
+
+    def _esci(self, chiave, livello):
+        gruppo = self._gruppi[livello]
+        gruppo.discard(chiave)
+        if not gruppo:
+            del self._gruppi[livello]
+            del self._livelli[bisect_left(self._livelli, livello)]
+
+    def _entra(self, chiave, livello):
+        gruppo = self._gruppi.get(livello)
+        if gruppo is None:
+            gruppo = self._gruppi[livello] = set()
+            insort(self._livelli, livello)
+        gruppo.add(chiave)
+
+    def prime(self, k):
+        """
+        Ritorna le k chiavi con il conteggio piu' alto come lista di coppie
+        (chiave, conteggio), a parita' di conteggio in ordine di chiave.
+        """
+        if k in self._prime:
+            return self._prime[k]
+
+        risultato = []
+        for livello in reversed(self._livelli):
+            mancanti = k - len(risultato)
+            if mancanti <= 0:
+                break
+            risultato.extend((chiave, livello) for chiave in heapq.nsmallest(mancanti, self._gruppi[livello]))
+
+        self._prime[k] = risultato
+        return risultato
+
+
+class Analisi:
+    """
+    Grafo ristoranti-ricette-ingredienti in memoria con tre classifiche
+    aggiornate a ogni collegamento:
+
+    - ingredienti per numero di ristoranti che li usano in almeno una ricetta;
+    - produttori per numero di ristoranti che usano almeno un loro ingrediente;
+    - ristoranti per numero di ricette nel menu.
+
+    Per ogni ingrediente viene contato in quante ricette di ciascun ristorante
+    compare (e per ogni produttore quanti suoi ingredienti usa ciascun ristorante):
+    le classifiche cambiano solo quando un conteggio passa da zero a uno o da uno
+    a zero. Tutte le operazioni sono idempotenti, quindi le modifiche del feed
+    gia' presenti nei dati letti possono essere riapplicate.
+    """
+
+    def __init__(self, cursore=0):
+        self.cursore = cursore
+        self.ricalcolata = time.monotonic()
+
+        self.ingredienti_di = defaultdict(set)
+        self.ricette_con = defaultdict(set)
+        self.ricette_di = defaultdict(set)
+        self.ristoranti_di = defaultdict(set)
+        self.produttore_di = {}
+
+        self._uso = defaultdict(Counter)
+        self._copertura = defaultdict(Counter)
+
+        self.ingredienti = Classifica()
+        self.produttori = Classifica()
+        self.menu = Classifica()
+
+    # Conteggi
+
+    @staticmethod
+    def _conta(contatori, chiave, ristorante, delta, classifica):
+        """
+        Varia di delta il conteggio (chiave, ristorante) e ritorna True se il
+        ristorante e' entrato o uscito dalla copertura della chiave.
+        """
+        contatore = contatori[chiave]
+        prima = contatore[ristorante]
+        dopo = prima + delta
+        if dopo:
+            contatore[ristorante] = dopo
+        else:
+            del contatore[ristorante]
+            if not contatore:
+                del contatori[chiave]
+
+        if not prima or not dopo:
+            classifica.varia(chiave, delta)
+            return True
+        return False
+
+    def _usa(self, ingrediente, ristorante, delta):
+        if self._conta(self._uso, ingrediente, ristorante, delta, self.ingredienti):
+            produttore = self.produttore_di.get(ingrediente)
+            if produttore is not None:
+                self._conta(self._copertura, produttore, ristorante, delta, self.produttori)
+
+    # Aggiornamenti incrementali
+
+    def imposta_produttore(self, ingrediente, produttore):
+        precedente = self.produttore_di.get(ingrediente)
+        if precedente == produttore:
+            return
+
+        ristoranti = list(self._uso.get(ingrediente, ()))
+        if precedente is not None:
+            for ristorante in ristoranti:
+                self._conta(self._copertura, precedente, ristorante, -1, self.produttori)
+        self.produttore_di[ingrediente] = produttore
+        for ristorante in ristoranti:
+            self._conta(self._copertura, produttore, ristorante, 1, self.produttori)
+
+    def collega_ingrediente(self, ricetta, ingrediente):
+        if ingrediente in self.ingredienti_di[ricetta]:
+            return
+        self.ingredienti_di[ricetta].add(ingrediente)
+        self.ricette_con[ingrediente].add(ricetta)
+        for ristorante in self.ristoranti_di[ricetta]:
+            self._usa(ingrediente, ristorante, 1)
+
+    def scollega_ingrediente(self, ricetta, ingrediente):
+        if ingrediente not in self.ingredienti_di[ricetta]:
+            return
+        self.ingredienti_di[ricetta].discard(ingrediente)
+        self.ricette_con[ingrediente].discard(ricetta)
+        for ristorante in self.ristoranti_di[ricetta]:
+            self._usa(ingrediente, ristorante, -1)
+
+    def collega_ricetta(self, ristorante, ricetta):
+        if ricetta in self.ricette_di[ristorante]:
+            return
+        self.ricette_di[ristorante].add(ricetta)
+        self.ristoranti_di[ricetta].add(ristorante)
+        self.menu.varia(ristorante, 1)
+        for ingrediente in self.ingredienti_di[ricetta]:
+            self._usa(ingrediente, ristorante, 1)
+
+    def scollega_ricetta(self, ristorante, ricetta):
+        if ricetta not in self.ricette_di[ristorante]:
+            return
+        self.ricette_di[ristorante].discard(ricetta)
+        self.ristoranti_di[ricetta].discard(ristorante)
+        self.menu.varia(ristorante, -1)
+        for ingrediente in self.ingredienti_di[ricetta]:
+            self._usa(ingrediente, ristorante, -1)
+
+    def elimina_ristorante(self, ristorante):
+        for ricetta in list(self.ricette_di.get(ristorante, ())):
+            self.scollega_ricetta(ristorante, ricetta)
+        self.ricette_di.pop(ristorante, None)
+
+    def elimina_ricetta(self, ricetta):
+        for ristorante in list(self.ristoranti_di.get(ricetta, ())):
+            self.scollega_ricetta(ristorante, ricetta)
+        for ingrediente in list(self.ingredienti_di.get(ricetta, ())):
+            self.scollega_ingrediente(ricetta, ingrediente)
+        self.ristoranti_di.pop(ricetta, None)
+        self.ingredienti_di.pop(ricetta, None)
+
+    def elimina_ingrediente(self, ingrediente):
+        for ricetta in list(self.ricette_con.get(ingrediente, ())):
+            self.scollega_ingrediente(ricetta, ingrediente)
+        self.ricette_con.pop(ingrediente, None)
+        self.produttore_di.pop(ingrediente, None)
+
+
+class ClassificheNonPronte(Exception):
+    """
+    Le classifiche del processo sono ancora in costruzione.
+    """
+
+
+_analisi = None
+_ricalcolo = None
+_lucchetto = threading.Lock()
+
+
+def _costruisci():
+    cursore = cursore_sicuro()
+    analisi = Analisi(cursore)
+
+    for ingrediente, produttore in Ingrediente.objects.values_list('nome', 'produttore').iterator():
+        analisi.imposta_produttore(ingrediente, produttore)
+    for ricetta, ingrediente in Ricetta.ingredienti.through.objects.values_list('ricetta_id', 'ingrediente_id').iterator():
+        analisi.collega_ingrediente(ricetta, ingrediente)
+    for ristorante, ricetta in Ristorante.ricette.through.objects.values_list('ristorante_id', 'ricetta_id').iterator():
+        analisi.collega_ricetta(ristorante, ricetta)
+
+    return analisi
+
+
+def _aggiorna(analisi):
+    """
+    Applica alle classifiche le modifiche registrate nel feed dopo il loro
+    cursore, come per l'indice di similarita'. Per gli ingredienti salvati viene
+    riletto il produttore, che il feed non riporta.
+    """
+    massimo = cursore_sicuro()
+    if massimo <= analisi.cursore:
+        return
+
+    modifiche = list(Modifica.objects
+                     .filter(pk__gt=analisi.cursore, pk__lte=massimo)
+                     .filter(Q(campo__in=['ingredienti', 'ricette'])
+                             | Q(operazione=Modifica.ELIMINATO)
+                             | Q(modello='ingrediente', operazione=Modifica.SALVATO))
+                     .order_by('pk')
+                     .values_list('modello', 'chiave', 'operazione', 'collegato'))
+
+    salvati = {chiave for modello, chiave, operazione, _ in modifiche if operazione == Modifica.SALVATO}
+    produttori = dict(Ingrediente.objects.filter(pk__in=salvati).values_list('nome', 'produttore')) if salvati else {}
+
+    for modello, chiave, operazione, collegato in modifiche:
+        if operazione == Modifica.SALVATO:
+            if chiave in produttori:
+                analisi.imposta_produttore(chiave, produttori[chiave])
+        elif operazione == Modifica.ELIMINATO:
+            getattr(analisi, f'elimina_{modello}')(chiave)
+        elif modello == 'ricetta':
+            if operazione == Modifica.COLLEGATO:
+                analisi.collega_ingrediente(chiave, collegato)
+            else:
+                analisi.scollega_ingrediente(chiave, collegato)
+        elif operazione == Modifica.COLLEGATO:
+            analisi.collega_ricetta(chiave, collegato)
+        else:
+            analisi.scollega_ricetta(chiave, collegato)
+
+    analisi.cursore = massimo
+
+
+def _ricalcola():
+    """
+    Ricostruisce le classifiche dal database e sostituisce quelle in uso, che
+    continuano a servire le richieste fino alla fine del ricalcolo. In caso di
+    errore restano quelle in uso e il ricalcolo viene ritentato dopo un altro
+    intervallo (o alla prossima richiesta, se non ce ne sono ancora).
+    """
+    global _analisi, _ricalcolo
+
+    try:
+        nuova = _costruisci()
+    except Exception:
+        nuova = None
+    finally:
+        connections.close_all()
+
+    with _lucchetto:
+        if nuova is not None:
+            _analisi = nuova
+        elif _analisi is not None:
+            _analisi.ricalcolata = time.monotonic()
+        _ricalcolo = None
+
+
+def _avvia_ricalcolo():
+    # Da chiamare tenendo _lucchetto
+    global _ricalcolo
+
+    if _ricalcolo is None:
+        _ricalcolo = threading.Thread(target=_ricalcola, daemon=True)
+        _ricalcolo.start()
+
+
+def classifiche(k):
+    """
+    Ritorna (cursore, ingredienti, produttori, ristoranti): le prime k voci di
+    ciascuna classifica come coppie (chiave, conteggio), aggiornate al cursore
+    del feed delle modifiche.
+
+    Le classifiche sono per processo: la prima richiesta ne avvia la costruzione
+    in un thread separato e solleva ClassificheNonPronte, come le successive fino
+    alla fine della costruzione, invece di scorrere le tabelle dei collegamenti
+    tenendo il lucchetto. Poi vengono aggiornate in modo incrementale e ricalcolate
+    in un thread separato ogni RESTAURANT_MANAGER_ANALISI_RICALCOLO secondi.
+    """
+    intervallo = getattr(settings, 'RESTAURANT_MANAGER_ANALISI_RICALCOLO', RICALCOLO_PREDEFINITO)
+
+    with _lucchetto:
+        if _analisi is None:
+            _avvia_ricalcolo()
+            raise ClassificheNonPronte()
+
+        _aggiorna(_analisi)
+        if time.monotonic() - _analisi.ricalcolata > intervallo:
+            _avvia_ricalcolo()
+
+        return (_analisi.cursore,
+                _analisi.ingredienti.prime(k),
+                _analisi.produttori.prime(k),
+                _analisi.menu.prime(k))
+
+
+def prepara_classifiche():
+    """
+    Costruisce subito le classifiche del processo, se non ci sono ancora: nel
+    master di gunicorn, con GUNICORN_PRELOAD_INDEXES=1 (vedi gunicorn.conf.py),
+    vengono ereditate da tutti i worker, che non rispondono 503 alle prime richieste.
+    """
+    global _analisi
+
+    nuova = _costruisci()
+    with _lucchetto:
+        if _analisi is None:
+            _analisi = nuova
+
+
+def azzera_analisi():
+    """
+    Scarta le classifiche del processo, che verranno ricostruite alla prossima richiesta.
+    """
+    global _analisi
+
+    with _lucchetto:
+        _analisi = None
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RestaurantManagerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'restaurant_manager'
+
+    def ready(self):
+        # Collega i ricevitori dei segnali che alimentano il feed delle modifiche
+        from . import modifiche  # noqa: F401
@@ -0,0 +1,149 @@
+from contextlib import contextmanager
+
+from django.db import router, transaction
+from django.db.models.signals import m2m_changed
+
+
+def _descrivi_campo(istanza, nome_campo):
+    """
+    Ritorna il modello intermedio del campo ManyToMany e i nomi delle colonne
+    che puntano all'istanza (sorgente) e all'oggetto collegato (destinazione).
+    """
+    campo = istanza._meta.get_field(nome_campo)
+    through = campo.remote_field.through
+
+    colonna_sorgente = through._meta.get_field(campo.m2m_field_name()).attname
+    colonna_destinazione = through._meta.get_field(campo.m2m_reverse_field_name()).attname
+
+    return campo, through, colonna_sorgente, colonna_destinazione
+
+
+def _normalizza_pk(oggetti):
+    """
+    Converte una lista di istanze o chiavi primarie in un insieme di chiavi primarie.
+    """
+    return {getattr(oggetto, 'pk', oggetto) for oggetto in oggetti}
+
+
+def _invia_segnale(through, istanza, campo, azione, pk_set, using):
+    m2m_changed.send(sender=through,
+                     action=azione,
+                     instance=istanza,
+                     reverse=False,
+                     model=campo.related_model,
+                     pk_set=pk_set,
+                     using=using)
+
+
+@contextmanager
+def istanza_bloccata(istanza):
+    """
+    Transazione sul database di scrittura dell'istanza, con la sua riga bloccata
+    (SELECT ... FOR UPDATE) fino alla conferma. Lettura dei collegamenti attuali,
+    salvataggio dei campi e applicazione della differenza vanno fatti qui dentro:
+    altrimenti due aggiornamenti concorrenti calcolano la differenza sullo stesso
+    stato e l'ultimo a confermare non vede le modifiche dell'altro.
+
+    Restituisce l'alias del database da usare.
+    """
+    modello = type(istanza)
+    using = router.db_for_write(modello, instance=istanza)
+
+    with transaction.atomic(using=using):
+        list(modello._base_manager.using(using)
+             .select_for_update()
+             .filter(pk=istanza.pk)
+             .values_list('pk', flat=True))
+        yield using
+
+
+def _applica_differenza(istanza, nome_campo, da_aggiungere, da_rimuovere, using):
+    """
+    Applica al modello intermedio una differenza gia' calcolata: una DELETE per i
+    collegamenti da rimuovere e una INSERT in blocco per quelli da aggiungere. Va
+    chiamata dentro istanza_bloccata(). Il segnale m2m_changed viene inviato una
+    sola volta per ciascuna operazione, con l'insieme completo delle chiavi.
+    """
+    campo, through, colonna_sorgente, colonna_destinazione = _descrivi_campo(istanza, nome_campo)
+
+    if da_rimuovere:
+        _invia_segnale(through, istanza, campo, 'pre_remove', da_rimuovere, using)
+        through._default_manager.using(using).filter(**{
+            colonna_sorgente: istanza.pk,
+            f'{colonna_destinazione}__in': da_rimuovere,
+        }).delete()
+        _invia_segnale(through, istanza, campo, 'post_remove', da_rimuovere, using)
+
+    if da_aggiungere:
+        _invia_segnale(through, istanza, campo, 'pre_add', da_aggiungere, using)
+        through._default_manager.using(using).bulk_create([
+            through(**{colonna_sorgente: istanza.pk, colonna_destinazione: pk})
+            for pk in da_aggiungere
+        ], ignore_conflicts=True)
+        _invia_segnale(through, istanza, campo, 'post_add', da_aggiungere, using)
+
+    return da_aggiungere, da_rimuovere
+
+
+def _collegamenti_attuali(istanza, nome_campo, using):
+    _, through, colonna_sorgente, colonna_destinazione = _descrivi_campo(istanza, nome_campo)
+
+    return set(through._default_manager
+               .using(using)
+               .filter(**{colonna_sorgente: istanza.pk})
+               .values_list(colonna_destinazione, flat=True))
+
+
+def aggiorna_collegamenti(istanza, nome_campo, oggetti):
+    """
+    Sostituisce i collegamenti di un campo ManyToMany con quelli indicati.
+    La differenza rispetto allo stato attuale viene calcolata con una sola
+    operazione tra insiemi e applicata in blocco.
+
+    Ritorna la coppia (aggiunti, rimossi).
+    """
+    desiderati = _normalizza_pk(oggetti)
+
+    with istanza_bloccata(istanza) as using:
+        attuali = _collegamenti_attuali(istanza, nome_campo, using)
+
+        return _applica_differenza(istanza, nome_campo,
+                                   da_aggiungere=desiderati - attuali,
+                                   da_rimuovere=attuali - desiderati,
+                                   using=using)
+
+
+def aggiungi_collegamenti(istanza, nome_campo, oggetti):
+    """
+    Aggiunge i collegamenti indicati, ignorando quelli gia' presenti.
+
+    Ritorna l'insieme delle chiavi effettivamente aggiunte.
+    """
+    richiesti = _normalizza_pk(oggetti)
+
+    with istanza_bloccata(istanza) as using:
+        attuali = _collegamenti_attuali(istanza, nome_campo, using)
+
+        aggiunti, _ = _applica_differenza(istanza, nome_campo,
+                                          da_aggiungere=richiesti - attuali,
+                                          da_rimuovere=set(),
+                                          using=using)
+    return aggiunti
+
+
+def rimuovi_collegamenti(istanza, nome_campo, oggetti):
+    """
+    Rimuove i collegamenti indicati, ignorando quelli non presenti.
+
+    Ritorna l'insieme delle chiavi effettivamente rimosse.
+    """
+    richiesti = _normalizza_pk(oggetti)
+
+    with istanza_bloccata(istanza) as using:
+        attuali = _collegamenti_attuali(istanza, nome_campo, using)
+
+        _, rimossi = _applica_differenza(istanza, nome_campo,
+                                         da_aggiungere=set(),
+                                         da_rimuovere=richiesti & attuali,
+                                         using=using)
+    return rimossi
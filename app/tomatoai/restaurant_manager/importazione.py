@@ -0,0 +1,151 @@
+from django.db import transaction
+
+from .collegamenti import aggiungi_collegamenti
+from .lavori import ParametriNonValidi
+from .models import Ristorante, Ricetta, Ingrediente
+from .modifiche import registra_salvataggi
+
+# Numero di oggetti scritti per transazione
+DIMENSIONE_BLOCCO = 1000
+
+# Per ogni lista del catalogo: campi di testo obbligatori e lista dei nomi collegati
+SCHEMA_CATALOGO = {
+    'ingredienti': (('nome', 'produttore'), None),
+    'ricette': (('nome',), 'ingredienti'),
+    'ristoranti': (('nome', 'indirizzo'), 'ricette'),
+}
+
+# Lunghezza massima di nomi, produttori e indirizzi (vedi models.py)
+LUNGHEZZA_MASSIMA = 100
+
+
+def _blocchi(elementi, dimensione=DIMENSIONE_BLOCCO):
+    for inizio in range(0, len(elementi), dimensione):
+        yield elementi[inizio:inizio + dimensione]
+
+
+def _testo_valido(valore):
+    return isinstance(valore, str) and 0 < len(valore) <= LUNGHEZZA_MASSIMA
+
+
+def valida_catalogo(parametri):
+    """
+    Verifica la struttura di un catalogo da importare (vedi importa_catalogo),
+    sollevando ParametriNonValidi al primo errore. Non accede al database: i
+    riferimenti a oggetti inesistenti vengono verificati durante l'importazione.
+    """
+    if not isinstance(parametri, dict):
+        raise ParametriNonValidi('Il catalogo deve essere un oggetto.')
+
+    sconosciute = set(parametri) - set(SCHEMA_CATALOGO)
+    if sconosciute:
+        raise ParametriNonValidi(f'Chiavi del catalogo sconosciute: {", ".join(sorted(sconosciute))}')
+
+    for chiave, (campi, collegati) in SCHEMA_CATALOGO.items():
+        elementi = parametri.get(chiave, [])
+        if not isinstance(elementi, list):
+            raise ParametriNonValidi(f'"{chiave}" deve essere una lista.')
+
+        for posizione, dati in enumerate(elementi):
+            if not isinstance(dati, dict):
+                raise ParametriNonValidi(f'{chiave}[{posizione}] deve essere un oggetto.')
+
+            for campo in campi:
+                if not _testo_valido(dati.get(campo)):
+                    raise ParametriNonValidi(f'{chiave}[{posizione}].{campo} deve essere un testo '
+                                             f'di 1-{LUNGHEZZA_MASSIMA} caratteri.')
+
+            if collegati is not None:
+                nomi = dati.get(collegati, [])
+                if not isinstance(nomi, list) or not all(_testo_valido(nome) for nome in nomi):
+                    raise ParametriNonValidi(f'{chiave}[{posizione}].{collegati} deve essere una lista di nomi.')
+
+
+def _verifica_esistenti(modello, nomi):
+    """
+    Solleva ValueError se qualcuno dei nomi non corrisponde a un oggetto esistente.
+    """
+    nomi = set(nomi)
+    esistenti = set(modello.objects.filter(pk__in=nomi).values_list('pk', flat=True))
+    mancanti = nomi - esistenti
+    if mancanti:
+        raise ValueError(f'{modello.__name__} inesistenti: {", ".join(sorted(mancanti))}')
+
+
+def importa_catalogo(parametri, progresso):
+    """
+    Importa in blocco un catalogo nel formato:
+
+        {
+            "ingredienti": [{"nome": ..., "produttore": ...}, ...],
+            "ricette": [{"nome": ..., "ingredienti": [...]}, ...],
+            "ristoranti": [{"nome": ..., "indirizzo": ..., "ricette": [...]}, ...]
+        }
+
+    Gli oggetti esistenti vengono aggiornati e i collegamenti solo aggiunti,
+    quindi l'importazione puo' essere ripetuta senza effetti collaterali in caso
+    di nuovo tentativo. Ogni blocco viene scritto in una transazione separata.
+
+    Gli oggetti scritti con bulk_create, che non invia post_save, vengono
+    registrati esplicitamente nel feed delle modifiche.
+    """
+    valida_catalogo(parametri)
+
+    ingredienti = parametri.get('ingredienti', [])
+    ricette = parametri.get('ricette', [])
+    ristoranti = parametri.get('ristoranti', [])
+
+    totale = max(len(ingredienti) + 2 * len(ricette) + 2 * len(ristoranti), 1)
+    fatti = 0
+
+    def avanza(quanti, messaggio):
+        nonlocal fatti
+        fatti += quanti
+        progresso(100 * fatti / totale, messaggio)
+
+    for blocco in _blocchi(ingredienti):
+        with transaction.atomic():
+            Ingrediente.objects.bulk_create(
+                [Ingrediente(nome=dati['nome'], produttore=dati['produttore']) for dati in blocco],
+                update_conflicts=True,
+                unique_fields=['nome'],
+                update_fields=['produttore'])
+            registra_salvataggi(Ingrediente, [dati['nome'] for dati in blocco])
+        avanza(len(blocco), 'Importazione ingredienti')
+
+    for blocco in _blocchi(ricette):
+        with transaction.atomic():
+            Ricetta.objects.bulk_create([Ricetta(nome=dati['nome']) for dati in blocco],
+                                        ignore_conflicts=True)
+            registra_salvataggi(Ricetta, [dati['nome'] for dati in blocco])
+        avanza(len(blocco), 'Importazione ricette')
+
+    for blocco in _blocchi(ristoranti):
+        with transaction.atomic():
+            Ristorante.objects.bulk_create(
+                [Ristorante(nome=dati['nome'], indirizzo=dati['indirizzo']) for dati in blocco],
+                update_conflicts=True,
+                unique_fields=['nome'],
+                update_fields=['indirizzo'])
+            registra_salvataggi(Ristorante, [dati['nome'] for dati in blocco])
+        avanza(len(blocco), 'Importazione ristoranti')
+
+    for blocco in _blocchi(ricette):
+        _verifica_esistenti(Ingrediente, (nome for dati in blocco for nome in dati.get('ingredienti', [])))
+        with transaction.atomic():
+            for dati in blocco:
+                aggiungi_collegamenti(Ricetta(nome=dati['nome']), 'ingredienti', dati.get('ingredienti', []))
+        avanza(len(blocco), 'Collegamento ingredienti')
+
+    for blocco in _blocchi(ristoranti):
+        _verifica_esistenti(Ricetta, (nome for dati in blocco for nome in dati.get('ricette', [])))
+        with transaction.atomic():
+            for dati in blocco:
+                aggiungi_collegamenti(Ristorante(nome=dati['nome']), 'ricette', dati.get('ricette', []))
+        avanza(len(blocco), 'Collegamento ricette')
+
+    return {
+        'ingredienti': len(ingredienti),
+        'ricette': len(ricette),
+        'ristoranti': len(ristoranti),
+    }
@@ -0,0 +1,471 @@
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections, router, transaction
+
+from .models import Ristorante, Ricetta, Ingrediente
+from .modifiche import cursore_sicuro
+
+# Formato del file (interi little-endian):
+#
+#   intestazione     FIRMA, FORMATO, versione (cursore del feed delle modifiche alla
+#                    pubblicazione), istante di pubblicazione, numero di oggetti per modello
+#   indice sezioni   (offset, lunghezza) in byte di ciascuna sezione di SEZIONI
+#   sezioni          allineate a 8 byte
+#
+# Le stringhe (nomi, indirizzi, produttori) sono ordinate e senza duplicati: ogni
+# oggetto le riferisce con la posizione nella tabella. Gli oggetti di ciascun modello
+# sono ordinati per nome, quindi anche i loro identificativi di stringa sono crescenti
+# e la ricerca per nome e' binaria. I collegamenti sono in forma CSR: per l'oggetto i
+# le destinazioni sono destinazioni[offset[i]:offset[i + 1]], in entrambe le direzioni.
+FIRMA = b'TMAI'
+FORMATO = 1
+INTESTAZIONE = struct.Struct('<4sIQdIII')
+VOCE_INDICE = struct.Struct('<QQ')
+ALLINEAMENTO = 8
+
+SEZIONI = (
+    'stringhe_offset', 'stringhe_dati',
+    'ristorante_nome', 'ristorante_indirizzo', 'ristorante_per_indirizzo',
+    'ricetta_nome',
+    'ingrediente_nome', 'ingrediente_produttore', 'ingrediente_per_produttore',
+    'ristorante_ricette_offset', 'ristorante_ricette',
+    'ricetta_ristoranti_offset', 'ricetta_ristoranti',
+    'ricetta_ingredienti_offset', 'ricetta_ingredienti',
+    'ingrediente_ricette_offset', 'ingrediente_ricette',
+)
+
+MODELLI = ('ristorante', 'ricetta', 'ingrediente')
+
+# Campi semplici di ciascun modello oltre al nome, nell'ordine dei serializer
+ATTRIBUTI = {
+    'ristorante': ('indirizzo',),
+    'ricetta': (),
+    'ingrediente': ('produttore',),
+}
+
+# Campi ManyToMany (diretti e inversi): modello di destinazione e campo inverso
+RELAZIONI = {
+    ('ristorante', 'ricette'): ('ricetta', 'ristoranti'),
+    ('ricetta', 'ristoranti'): ('ristorante', 'ricette'),
+    ('ricetta', 'ingredienti'): ('ingrediente', 'ricette'),
+    ('ingrediente', 'ricette'): ('ricetta', 'ingredienti'),
+}
+
+# Campi ManyToMany riportati nelle risposte, come dai serializer
+CAMPI_SERIALIZZATI = {
+    'ristorante': ('ricette',),
+    'ricetta': ('ingredienti',),
+    'ingrediente': (),
+}
+
+
+class FiltroNonSupportato(Exception):
+    """
+    Il filtro usa un lookup che l'istantanea non sa valutare: la richiesta va
+    servita dal database.
+    """
+
+
+def _u32(valori):
+    risultato = array('I', valori)
+    if sys.byteorder != 'little':
+        risultato.byteswap()
+    return risultato
+
+
+def _adiacenza(coppie, numero):
+    """
+    Converte le coppie (origine, destinazione) in forma CSR: ritorna gli array
+    degli offset e delle destinazioni, ordinate per ciascuna origine.
+    """
+    liste = [[] for _ in range(numero)]
+    for origine, destinazione in coppie:
+        liste[origine].append(destinazione)
+
+    offset = [0]
+    destinazioni = []
+    for lista in liste:
+        lista.sort()
+        destinazioni.extend(lista)
+        offset.append(len(destinazioni))
+
+    return _u32(offset), _u32(destinazioni)
+
+
+@contextmanager
+def _lettura_coerente(modello):
+    """
+    Esegue le letture del blocco in una transazione che vede un'unica istantanea
+    del database. SQLite e MySQL (REPEATABLE READ) la garantiscono gia' dentro una
+    transazione, PostgreSQL solo se l'isolamento viene alzato prima della prima
+    query; dentro una transazione gia' aperta resta l'isolamento di quella.
+    """
+    alias = router.db_for_read(modello)
+    connessione = connections[alias]
+    nuova = not connessione.in_atomic_block
+
+    with transaction.atomic(using=alias):
+        if nuova and connessione.vendor == 'postgresql':
+            with connessione.cursor() as cursore:
+                cursore.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        yield
+
+
+def compila_catalogo():
+    """
+    Legge ristoranti, ricette, ingredienti e collegamenti e ritorna l'istantanea
+    serializzata (bytes).
+
+    Tutte le letture avvengono nella stessa transazione, quindi su un'unica
+    istantanea del database. Il cursore del feed viene letto prima dei dati: le
+    modifiche concorrenti alla lettura vengono riapplicate dai client che
+    ripartono da quel cursore. Come per gli altri lettori del feed non supera
+    cursore_sicuro(), altrimenti i client potrebbero saltare modifiche non ancora
+    confermate.
+    """
+    with _lettura_coerente(Ristorante):
+        versione = cursore_sicuro()
+
+        ristoranti = sorted(Ristorante.objects.values_list('nome', 'indirizzo'))
+        ricette = sorted(Ricetta.objects.values_list('nome', flat=True))
+        ingredienti = sorted(Ingrediente.objects.values_list('nome', 'produttore'))
+
+        collegamenti_ricette = list(Ristorante.ricette.through.objects.values_list('ristorante_id', 'ricetta_id'))
+        collegamenti_ingredienti = list(Ricetta.ingredienti.through.objects.values_list('ricetta_id', 'ingrediente_id'))
+
+    stringhe = sorted({valore for riga in ristoranti for valore in riga}
+                      | set(ricette)
+                      | {valore for riga in ingredienti for valore in riga})
+    codificate = [stringa.encode('utf-8') for stringa in stringhe]
+    posizione_stringa = {stringa: i for i, stringa in enumerate(stringhe)}
+
+    posizione_ristorante = {nome: i for i, (nome, _) in enumerate(ristoranti)}
+    posizione_ricetta = {nome: i for i, nome in enumerate(ricette)}
+    posizione_ingrediente = {nome: i for i, (nome, _) in enumerate(ingredienti)}
+
+    # Con letture coerenti ogni collegamento ha entrambi gli estremi; se il database
+    # non le garantisce, quelli verso oggetti non letti vengono scartati
+    ristorante_ricette = [(posizione_ristorante[ristorante], posizione_ricetta[ricetta])
+                          for ristorante, ricetta in collegamenti_ricette
+                          if ristorante in posizione_ristorante and ricetta in posizione_ricetta]
+    ricetta_ingredienti = [(posizione_ricetta[ricetta], posizione_ingrediente[ingrediente])
+                           for ricetta, ingrediente in collegamenti_ingredienti
+                           if ricetta in posizione_ricetta and ingrediente in posizione_ingrediente]
+
+    indirizzi = [posizione_stringa[indirizzo] for _, indirizzo in ristoranti]
+    produttori = [posizione_stringa[produttore] for _, produttore in ingredienti]
+
+    offset_stringhe = [0]
+    for codificata in codificate:
+        offset_stringhe.append(offset_stringhe[-1] + len(codificata))
+
+    sezioni = {
+        'stringhe_offset': _u32(offset_stringhe),
+        'stringhe_dati': b''.join(codificate),
+        'ristorante_nome': _u32(posizione_stringa[nome] for nome, _ in ristoranti),
+        'ristorante_indirizzo': _u32(indirizzi),
+        'ristorante_per_indirizzo': _u32(sorted(range(len(ristoranti)), key=indirizzi.__getitem__)),
+        'ricetta_nome': _u32(posizione_stringa[nome] for nome in ricette),
+        'ingrediente_nome': _u32(posizione_stringa[nome] for nome, _ in ingredienti),
+        'ingrediente_produttore': _u32(produttori),
+        'ingrediente_per_produttore': _u32(sorted(range(len(ingredienti)), key=produttori.__getitem__)),
+    }
+    (sezioni['ristorante_ricette_offset'],
+     sezioni['ristorante_ricette']) = _adiacenza(ristorante_ricette, len(ristoranti))
+    (sezioni['ricetta_ristoranti_offset'],
+     sezioni['ricetta_ristoranti']) = _adiacenza(((b, a) for a, b in ristorante_ricette), len(ricette))
+    (sezioni['ricetta_ingredienti_offset'],
+     sezioni['ricetta_ingredienti']) = _adiacenza(ricetta_ingredienti, len(ricette))
+    (sezioni['ingrediente_ricette_offset'],
+     sezioni['ingrediente_ricette']) = _adiacenza(((b, a) for a, b in ricetta_ingredienti), len(ingredienti))
+
+    intestazione = INTESTAZIONE.pack(FIRMA, FORMATO, versione, time.time(),
+                                     len(ristoranti), len(ricette), len(ingredienti))
+
+    corpo = bytearray()
+    indice = []
+    inizio = len(intestazione) + VOCE_INDICE.size * len(SEZIONI)
+    for nome in SEZIONI:
+        corpo.extend(b'\0' * (-(inizio + len(corpo)) % ALLINEAMENTO))
+        dati = bytes(sezioni[nome])
+        indice.append(VOCE_INDICE.pack(inizio + len(corpo), len(dati)))
+        corpo.extend(dati)
+
+    return intestazione + b''.join(indice) + bytes(corpo)
+
+
+def percorso_istantanea():
+    return getattr(settings, 'RESTAURANT_MANAGER_ISTANTANEA', None)
+
+
+def pubblica_istantanea(percorso=None):
+    """
+    Compila il catalogo e lo pubblica nel percorso indicato (predefinito:
+    RESTAURANT_MANAGER_ISTANTANEA). Il file viene scritto accanto a quello
+    pubblicato e poi rinominato, quindi i processi vedono sempre o la versione
+    precedente o quella nuova, mai un file parziale.
+
+    Ritorna l'istantanea pubblicata.
+    """
+    percorso = percorso or percorso_istantanea()
+    if not percorso:
+        raise ValueError('Nessun percorso per l\'istantanea: impostare RESTAURANT_MANAGER_ISTANTANEA.')
+
+    dati = compila_catalogo()
+
+    cartella = os.path.dirname(os.path.abspath(percorso))
+    descrittore, temporaneo = tempfile.mkstemp(dir=cartella, prefix='.istantanea-')
+    try:
+        with os.fdopen(descrittore, 'wb') as file:
+            file.write(dati)
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(temporaneo, 0o644)
+        os.replace(temporaneo, percorso)
+    except BaseException:
+        os.unlink(temporaneo)
+        raise
+
+    return Istantanea.apri(percorso)
+
+
+def pubblica_catalogo(parametri, progresso):
+    """
+    Lavoro 'pubblica_catalogo': pubblica una nuova istantanea del catalogo nel
+    percorso dei parametri o in quello configurato.
+    """
+    istantanea = pubblica_istantanea(parametri.get('percorso'))
+    return istantanea.descrizione()
+
+
+class Istantanea:
+    """
+    Istantanea del catalogo mappata in memoria in sola lettura.
+
+    Le sezioni sono viste (memoryview) sulla mappatura, non copie: le pagine del
+    file restano nella page cache e sono condivise da tutti i processi che lo
+    aprono, quindi la memoria occupata non cresce con il numero di worker. Le
+    stringhe vengono decodificate solo quando servono a una risposta.
+    """
+
+    def __init__(self, mappatura, identita=None):
+        self.identita = identita
+        self._mappatura = mappatura
+
+        if len(mappatura) < INTESTAZIONE.size:
+            raise ValueError('Istantanea troncata.')
+        (firma, formato, self.versione, self.pubblicata,
+         *numeri) = INTESTAZIONE.unpack_from(mappatura, 0)
+        if firma != FIRMA:
+            raise ValueError('Il file non e\' un\'istantanea del catalogo.')
+        if sys.byteorder != 'little':
+            raise ValueError('Le istantanee possono essere lette solo su sistemi little-endian.')
+        if formato != FORMATO:
+            raise ValueError(f'Formato dell\'istantanea {formato} non supportato (atteso {FORMATO}).')
+        self.numeri = dict(zip(MODELLI, numeri))
+
+        vista = memoryview(mappatura)
+        self._sezioni = {}
+        for posizione, nome in enumerate(SEZIONI):
+            offset, lunghezza = VOCE_INDICE.unpack_from(mappatura, INTESTAZIONE.size + posizione * VOCE_INDICE.size)
+            if offset + lunghezza > len(mappatura):
+                raise ValueError('Istantanea troncata.')
+            sezione = vista[offset:offset + lunghezza]
+            self._sezioni[nome] = sezione if nome == 'stringhe_dati' else sezione.cast('I')
+
+    @classmethod
+    def apri(cls, percorso):
+        with open(percorso, 'rb') as file:
+            stato = os.fstat(file.fileno())
+            mappatura = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mappatura, _identita(stato))
+
+    def descrizione(self):
+        return {'versione': self.versione, 'pubblicata': self.pubblicata, **self.numeri}
+
+    # Stringhe
+
+    def stringa(self, posizione):
+        offset = self._sezioni['stringhe_offset']
+        return str(self._sezioni['stringhe_dati'][offset[posizione]:offset[posizione + 1]], 'utf-8')
+
+    def _codificata(self, posizione):
+        offset = self._sezioni['stringhe_offset']
+        return bytes(self._sezioni['stringhe_dati'][offset[posizione]:offset[posizione + 1]])
+
+    def cerca_stringa(self, valore):
+        """
+        Ritorna la posizione della stringa nella tabella, o None se non c'e'.
+        """
+        codificato = valore.encode('utf-8')
+        numero = len(self._sezioni['stringhe_offset']) - 1
+        posizione = bisect_left(range(numero), codificato, key=self._codificata)
+        if posizione < numero and self._codificata(posizione) == codificato:
+            return posizione
+        return None
+
+    # Oggetti e collegamenti
+
+    def _per_nome(self, modello, valore):
+        stringa = self.cerca_stringa(valore)
+        if stringa is None:
+            return set()
+
+        nomi = self._sezioni[f'{modello}_nome']
+        posizione = bisect_left(nomi, stringa)
+        if posizione < len(nomi) and nomi[posizione] == stringa:
+            return {posizione}
+        return set()
+
+    def _per_attributo(self, modello, attributo, valore):
+        stringa = self.cerca_stringa(valore)
+        if stringa is None:
+            return set()
+
+        valori = self._sezioni[f'{modello}_{attributo}']
+        ordinati = self._sezioni[f'{modello}_per_{attributo}']
+        inizio = bisect_left(ordinati, stringa, key=valori.__getitem__)
+        fine = bisect_right(ordinati, stringa, lo=inizio, key=valori.__getitem__)
+        return set(ordinati[inizio:fine])
+
+    def collegati(self, modello, campo, posizione):
+        offset = self._sezioni[f'{modello}_{campo}_offset']
+        return self._sezioni[f'{modello}_{campo}'][offset[posizione]:offset[posizione + 1]]
+
+    def _valuta(self, modello, condizioni):
+        """
+        Ritorna le posizioni degli oggetti del modello che soddisfano le condizioni
+        (lookup -> valore), o None se non ci sono condizioni.
+
+        Come in un'unica chiamata a QuerySet.filter(), le condizioni che attraversano
+        la stessa relazione devono valere per lo stesso oggetto collegato.
+        """
+        risultato = None
+        relazioni = {}
+
+        for lookup, valore in condizioni.items():
+            campo, _, resto = lookup.partition('__')
+            if resto:
+                if (modello, campo) not in RELAZIONI:
+                    raise FiltroNonSupportato(lookup)
+                relazioni.setdefault(campo, {})[resto] = valore
+                continue
+
+            if campo == 'nome':
+                trovati = self._per_nome(modello, valore)
+            elif campo in ATTRIBUTI[modello]:
+                trovati = self._per_attributo(modello, campo, valore)
+            else:
+                raise FiltroNonSupportato(lookup)
+            risultato = trovati if risultato is None else risultato & trovati
+
+        for campo, sottocondizioni in relazioni.items():
+            destinazione, inverso = RELAZIONI[modello, campo]
+            trovati = set()
+            for posizione in self._valuta(destinazione, sottocondizioni):
+                trovati.update(self.collegati(destinazione, inverso, posizione))
+            risultato = trovati if risultato is None else risultato & trovati
+
+        return risultato
+
+    def _oggetto(self, modello, posizione):
+        dati = {'nome': self.stringa(self._sezioni[f'{modello}_nome'][posizione])}
+        for attributo in ATTRIBUTI[modello]:
+            dati[attributo] = self.stringa(self._sezioni[f'{modello}_{attributo}'][posizione])
+
+        for campo in CAMPI_SERIALIZZATI[modello]:
+            destinazione, _ = RELAZIONI[modello, campo]
+            nomi = self._sezioni[f'{destinazione}_nome']
+            dati[campo] = [self.stringa(nomi[collegato]) for collegato in self.collegati(modello, campo, posizione)]
+
+        return dati
+
+    def elenco(self, modello, filtri, parametri):
+        """
+        Ritorna gli oggetti del modello, ordinati per nome, nella forma dei serializer.
+        `filtri` e `parametri` hanno lo stesso significato che in FiltriMixin.filtra.
+
+        Solleva FiltroNonSupportato se un filtro non puo' essere valutato sull'istantanea.
+        """
+        condizioni = {}
+        for parametro, lookup in filtri.items():
+            valore = parametri.get(parametro, None)
+            if valore:
+                condizioni[lookup] = valore
+
+        posizioni = self._valuta(modello, condizioni)
+        if posizioni is None:
+            posizioni = range(self.numeri[modello])
+        else:
+            posizioni = sorted(posizioni)
+
+        return [self._oggetto(modello, posizione) for posizione in posizioni]
+
+
+def _identita(stato):
+    return (stato.st_dev, stato.st_ino, stato.st_size, stato.st_mtime_ns)
+
+
+_istantanea = None
+_scartata = None
+_lucchetto = threading.Lock()
+
+
+def ottieni_istantanea():
+    """
+    Ritorna l'istantanea pubblicata, o None se non e' configurata, non e' ancora
+    stata pubblicata o non e' leggibile (ad esempio perche' scritta con un altro
+    formato): in questi casi le richieste vengono servite dal database.
+
+    A ogni chiamata il file viene controllato con una stat(): quando una nuova
+    versione sostituisce la precedente viene mappata e scambiata con quella in uso.
+    Le richieste in corso continuano a leggere la mappatura precedente, che viene
+    rilasciata quando non e' piu' riferita.
+    """
+    global _istantanea, _scartata
+
+    percorso = percorso_istantanea()
+    if not percorso:
+        return None
+
+    try:
+        identita = _identita(os.stat(percorso))
+    except FileNotFoundError:
+        return None
+
+    istantanea = _istantanea
+    if istantanea is not None and istantanea.identita == identita:
+        return istantanea
+    if _scartata == identita:
+        return None
+
+    with _lucchetto:
+        if _istantanea is None or _istantanea.identita != identita:
+            try:
+                _istantanea = Istantanea.apri(percorso)
+            except FileNotFoundError:
+                return None
+            except ValueError:
+                _istantanea, _scartata = None, identita
+                return None
+        return _istantanea
+
+
+def azzera_istantanea():
+    """
+    Rilascia l'istantanea del processo, che verra' riaperta alla prossima richiesta.
+    """
+    global _istantanea, _scartata
+
+    with _lucchetto:
+        _istantanea = _scartata = None
@@ -0,0 +1,151 @@
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Lavoro
+
+# Tipi di lavoro accodabili e funzione che li esegue. Le funzioni vengono importate
+# solo dal worker al momento dell'esecuzione, cosi' le dipendenze pesanti non
+# vengono caricate dai processi web.
+TIPI_LAVORO = {
+    'importa_catalogo': 'restaurant_manager.importazione.importa_catalogo',
+    'pubblica_catalogo': 'restaurant_manager.istantanee.pubblica_catalogo',
+    'compatta_modifiche': 'restaurant_manager.modifiche.compatta_modifiche',
+}
+
+# Funzioni che verificano i parametri di un tipo di lavoro gia' all'accodamento,
+# sollevando ParametriNonValidi. Non accedono al database.
+VALIDATORI_PARAMETRI = {
+    'importa_catalogo': 'restaurant_manager.importazione.valida_catalogo',
+}
+
+# Attesa prima di un nuovo tentativo: RITARDO_BASE * 2 ** (tentativi - 1)
+RITARDO_BASE = timedelta(seconds=30)
+
+
+class ParametriNonValidi(Exception):
+    """
+    I parametri di un lavoro non sono validi: il lavoro viene rifiutato
+    all'accodamento, o marcato come fallito senza nuovi tentativi, che
+    fallirebbero allo stesso modo.
+    """
+
+
+def valida_parametri(tipo, parametri):
+    """
+    Verifica i parametri di un lavoro del tipo indicato, sollevando ParametriNonValidi.
+    """
+    if tipo in VALIDATORI_PARAMETRI:
+        import_string(VALIDATORI_PARAMETRI[tipo])(parametri)
+
+
+def accoda(tipo, parametri=None, max_tentativi=3):
+    """
+    Inserisce un nuovo lavoro in coda e lo ritorna.
+    """
+    if tipo not in TIPI_LAVORO:
+        raise ValueError(f'Tipo di lavoro "{tipo}" sconosciuto.')
+
+    parametri = parametri or {}
+    valida_parametri(tipo, parametri)
+
+    return Lavoro.objects.create(tipo=tipo,
+                                 parametri=parametri,
+                                 max_tentativi=max_tentativi)
+
+
+def preleva_lavori(quanti):
+    """
+    Prenota fino a `quanti` lavori pronti per l'esecuzione e ne ritorna le chiavi.
+    La prenotazione e' un UPDATE condizionato sullo stato, quindi piu' worker
+    possono prelevare dalla stessa coda senza eseguire due volte lo stesso lavoro.
+    """
+    adesso = timezone.now()
+    candidati = (Lavoro.objects
+                 .filter(stato=Lavoro.IN_CODA, disponibile_da__lte=adesso)
+                 .order_by('disponibile_da', 'pk')
+                 .values_list('pk', flat=True)[:quanti])
+
+    prelevati = []
+    for pk in candidati:
+        prenotato = (Lavoro.objects
+                     .filter(pk=pk, stato=Lavoro.IN_CODA)
+                     .update(stato=Lavoro.IN_ESECUZIONE,
+                             tentativi=F('tentativi') + 1,
+                             aggiornato=adesso))
+        if prenotato:
+            prelevati.append(pk)
+
+    return prelevati
+
+
+def rilascia_lavori(lavori, messaggio):
+    """
+    Libera i lavori ancora in esecuzione del queryset, il cui worker e' terminato
+    senza registrarne l'esito: tornano in coda se hanno tentativi disponibili,
+    altrimenti vengono marcati come falliti, cosi' un lavoro che termina ogni
+    volta il proprio worker non viene ritentato all'infinito.
+
+    Ritorna (rimessi in coda, falliti).
+    """
+    lavori = lavori.filter(stato=Lavoro.IN_ESECUZIONE)
+    adesso = timezone.now()
+
+    falliti = (lavori
+               .filter(tentativi__gte=F('max_tentativi'))
+               .update(stato=Lavoro.FALLITO, messaggio=messaggio[:255], aggiornato=adesso))
+    rimessi = (lavori
+               .filter(tentativi__lt=F('max_tentativi'))
+               .update(stato=Lavoro.IN_CODA, aggiornato=adesso))
+
+    return rimessi, falliti
+
+
+def recupera_lavori_scaduti(scadenza):
+    """
+    Libera i lavori rimasti in esecuzione senza aggiornamenti da piu' di
+    `scadenza`, tipicamente perche' il worker che li eseguiva e' terminato.
+    Ritorna (rimessi in coda, falliti).
+    """
+    limite = timezone.now() - scadenza
+
+    return rilascia_lavori(Lavoro.objects.filter(aggiornato__lt=limite),
+                           'Nessun aggiornamento entro la scadenza: worker terminato?')
+
+
+def esegui_lavoro(pk):
+    """
+    Esegue un lavoro gia' prenotato e ne registra l'esito. In caso di errore il
+    lavoro viene rimesso in coda con un'attesa crescente, finche' non esaurisce
+    i tentativi disponibili; se i parametri non sono validi fallisce subito.
+
+    Ritorna lo stato finale del lavoro.
+    """
+    lavoro = Lavoro.objects.get(pk=pk)
+
+    def progresso(percentuale, messaggio=''):
+        Lavoro.objects.filter(pk=pk).update(progresso=max(0, min(int(percentuale), 100)),
+                                            messaggio=messaggio[:255],
+                                            aggiornato=timezone.now())
+
+    try:
+        funzione = import_string(TIPI_LAVORO[lavoro.tipo])
+        risultato = funzione(lavoro.parametri, progresso)
+    except Exception as exc:
+        lavoro.messaggio = f'{type(exc).__name__}: {exc}'[:255]
+        if lavoro.tentativi < lavoro.max_tentativi and not isinstance(exc, ParametriNonValidi):
+            lavoro.stato = Lavoro.IN_CODA
+            lavoro.disponibile_da = timezone.now() + RITARDO_BASE * 2 ** (lavoro.tentativi - 1)
+        else:
+            lavoro.stato = Lavoro.FALLITO
+        lavoro.save(update_fields=['stato', 'messaggio', 'disponibile_da', 'aggiornato'])
+        return lavoro.stato
+
+    Lavoro.objects.filter(pk=pk).update(stato=Lavoro.COMPLETATO,
+                                        progresso=100,
+                                        messaggio='',
+                                        risultato=risultato,
+                                        aggiornato=timezone.now())
+    return Lavoro.COMPLETATO
@@ -0,0 +1,231 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+from .istantanee import ottieni_istantanea
+from .stime import stima_righe
+
+# Valori predefiniti di ciascun limite di RESTAURANT_MANAGER_LIMITI
+PREDEFINITI = {
+    'capacita': 600,         # token massimi del secchio di ciascun client
+    'ricarica': 10,          # token aggiunti al secondo
+    'lotto': None,           # token prelevati alla volta dal secchio condiviso (predefinito: capacita / 20)
+    'costo_join': 1,         # token per ogni relazione attraversata dai filtri
+    'righe_per_token': 50,   # righe stimate della risposta pagate con un token
+    'costo_scrittura': 5,    # token per le richieste che modificano i dati
+}
+
+# Frazione delle righe attesa per ciascun filtro di uguaglianza diverso dalla chiave primaria
+SELETTIVITA = 0.01
+
+# Secondi per cui vengono riusate le stime del numero di righe delle tabelle
+DURATA_STIME = 60
+
+# Client con token locali oltre i quali i lotti del processo vengono scartati
+MASSIMO_CLIENTI = 10000
+
+# Tentativi di acquisire il lucchetto del secchio condiviso, a 1 ms l'uno dall'altro
+TENTATIVI_LUCCHETTO = 10
+
+# Secondi di validita' del lucchetto e attesa chiesta al client quando non si riesce ad acquisirlo
+DURATA_LUCCHETTO = 1
+
+
+def limite_di(scope):
+    """
+    Ritorna la configurazione completa del limite per lo scope, o None se lo
+    scope non e' limitato.
+    """
+    configurazione = getattr(settings, 'RESTAURANT_MANAGER_LIMITI', {}).get(scope)
+    if configurazione is None:
+        return None
+
+    limite = {**PREDEFINITI, **configurazione}
+    if limite['lotto'] is None:
+        limite['lotto'] = max(1, limite['capacita'] // 20)
+    return limite
+
+
+_stime = {}
+
+
+def _righe_stimate(modello):
+    # Con un'istantanea pubblicata il numero di oggetti e' noto senza interrogare il database
+    istantanea = ottieni_istantanea()
+    if istantanea is not None and modello._meta.model_name in istantanea.numeri:
+        return istantanea.numeri[modello._meta.model_name]
+
+    righe, scadenza = _stime.get(modello, (None, 0))
+    adesso = time.monotonic()
+    if adesso >= scadenza:
+        righe = stima_righe(modello) or 0
+        _stime[modello] = (righe, adesso + DURATA_STIME)
+    return righe
+
+
+def stima_costo(view, request, limite):
+    """
+    Ritorna il costo in token della richiesta senza eseguirla: le liste costano in
+    proporzione alle righe stimate della risposta e alle relazioni attraversate dai
+    filtri (vedi FiltriMixin), le letture di un singolo oggetto un token, le
+    scritture `costo_scrittura`.
+    """
+    if request.method not in SAFE_METHODS:
+        return limite['costo_scrittura']
+
+    queryset = getattr(view, 'queryset', None)
+    if getattr(view, 'detail', False) or queryset is None:
+        return 1
+
+    attivi = [lookup for parametro, lookup in getattr(view, 'filtri', {}).items()
+              if request.query_params.get(parametro)]
+
+    modello = queryset.model
+    if modello._meta.pk.name in attivi:
+        righe = 1
+    else:
+        righe = _righe_stimate(modello) * SELETTIVITA ** len(attivi)
+    join = sum(lookup.count('__') for lookup in attivi)
+
+    return 1 + join * limite['costo_join'] + math.ceil(righe / limite['righe_per_token'])
+
+
+@contextmanager
+def _lucchetto_condiviso(cache, chiave):
+    """
+    Serializza gli aggiornamenti del secchio tra processi con cache.add(), atomica
+    su tutti i backend di cache, e indica se il lucchetto e' stato acquisito. Se
+    resta occupato per TENTATIVI_LUCCHETTO tentativi il secchio non va toccato:
+    procedere comunque permetterebbe a piu' processi di leggerlo e riscriverlo
+    insieme, perdendo i prelievi. Il lucchetto scade dopo DURATA_LUCCHETTO secondi,
+    quindi un processo terminato mentre lo teneva blocca il secchio al piu' per
+    quel tempo.
+    """
+    lucchetto = chiave + ':lucchetto'
+    for _ in range(TENTATIVI_LUCCHETTO):
+        if cache.add(lucchetto, 1, timeout=DURATA_LUCCHETTO):
+            try:
+                yield True
+            finally:
+                cache.delete(lucchetto)
+            return
+        time.sleep(0.001)
+    yield False
+
+
+def _preleva(scope, cliente, mancanti, limite):
+    """
+    Preleva dal secchio condiviso del client almeno `mancanti` token, e fino a un
+    lotto. Ritorna (concessi, rimasti nel secchio, attesa in secondi): se il secchio
+    non ne ha abbastanza non preleva nulla e l'attesa e' il tempo per ricaricarli.
+    Se il secchio e' bloccato da altri processi non preleva nulla, i rimasti sono
+    None e l'attesa e' DURATA_LUCCHETTO.
+    """
+    cache = caches[getattr(settings, 'RESTAURANT_MANAGER_LIMITI_CACHE', 'default')]
+    chiave = f'limiti:{scope}:{cliente}'
+    capacita, ricarica = limite['capacita'], limite['ricarica']
+    # Dopo questo tempo il secchio sarebbe comunque pieno
+    durata = math.ceil(capacita / ricarica) + 1
+
+    with _lucchetto_condiviso(cache, chiave) as acquisito:
+        if not acquisito:
+            return 0, None, DURATA_LUCCHETTO
+
+        adesso = time.time()
+        token, istante = cache.get(chiave) or (capacita, adesso)
+        token = min(capacita, token + (adesso - istante) * ricarica)
+
+        if token < mancanti:
+            return 0, token, (mancanti - token) / ricarica
+
+        concessi = min(token, max(mancanti, limite['lotto']))
+        cache.set(chiave, (token - concessi, adesso), timeout=durata)
+        return concessi, token - concessi, 0
+
+
+# Token gia' prelevati dal processo per ciascun (scope, client) e ultimi token
+# noti del secchio condiviso
+_locali = {}
+_lucchetto_locali = threading.Lock()
+
+
+def azzera_locali():
+    """
+    Scarta i token prelevati dal processo e le stime delle tabelle.
+    """
+    with _lucchetto_locali:
+        _locali.clear()
+    _stime.clear()
+
+
+class CostoThrottle(BaseThrottle):
+    """
+    Limita le richieste di ciascun client con un secchio di token per scope
+    (l'attributo `throttle_scope` della vista, configurato in
+    RESTAURANT_MANAGER_LIMITI). Ogni richiesta spende il suo costo stimato.
+
+    Il secchio e' nella cache condivisa, ma ogni processo ne preleva un lotto di
+    token alla volta e li spende localmente: la maggior parte delle richieste non
+    accede alla cache e costa qualche microsecondo. I token prelevati e non spesi
+    da un processo restano del client, quindi il limite complessivo non cambia.
+    """
+
+    def __init__(self):
+        self.attesa = None
+
+    def cliente(self, request):
+        utente = getattr(request, 'user', None)
+        if utente is not None and utente.is_authenticated:
+            return f'utente:{utente.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        limite = limite_di(scope) if scope else None
+        if limite is None:
+            return True
+
+        costo = min(stima_costo(view, request, limite), limite['capacita'])
+        chiave = (scope, self.cliente(request))
+
+        with _lucchetto_locali:
+            locale = _locali.get(chiave)
+            if locale is not None and locale[0] >= costo:
+                locale[0] -= costo
+                return self._riporta(view, limite, costo, locale, True)
+            disponibili = locale[0] if locale is not None else 0
+
+        concessi, condivisi, attesa = _preleva(scope, chiave[1], costo - disponibili, limite)
+
+        with _lucchetto_locali:
+            if chiave not in _locali and len(_locali) >= MASSIMO_CLIENTI:
+                _locali.clear()
+            locale = _locali.setdefault(chiave, [0, 0])
+            locale[0] += concessi
+            if condivisi is not None:
+                locale[1] = condivisi
+
+            if locale[0] < costo:
+                self.attesa = attesa
+                return self._riporta(view, limite, costo, locale, False)
+
+            locale[0] -= costo
+            return self._riporta(view, limite, costo, locale, True)
+
+    @staticmethod
+    def _riporta(view, limite, costo, locale, concessa):
+        view.intestazioni_limite = {
+            'X-RateLimit-Limit': str(limite['capacita']),
+            'X-RateLimit-Remaining': str(int(locale[0] + locale[1])),
+            'X-RateLimit-Cost': str(costo),
+        }
+        return concessa
+
+    def wait(self):
+        return self.attesa
@@ -0,0 +1,131 @@
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Comandi per avviare ciascun server, {porta} viene sostituito al momento dell'avvio
+SERVER = {
+    'runserver': [sys.executable, 'manage.py', 'runserver', '--noreload', '127.0.0.1:{porta}'],
+    'gunicorn': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', '127.0.0.1:{porta}'],
+    'uvicorn': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', '127.0.0.1:{porta}',
+                '--worker-class', 'uvicorn.workers.UvicornWorker'],
+}
+
+# I limiti di richieste dell'API sono disattivati in tutti i server: altrimenti
+# il carico misurerebbe soprattutto le risposte 429
+SENZA_LIMITI = {'DJANGO_RATE_LIMITS': 'off'}
+
+# Variabili d'ambiente dei server, le altre dei server di produzione sono in gunicorn.conf.py.
+# Il profilo di settings va indicato sempre: manage.py imposta DJANGO_SETTINGS_MODULE
+# a quello di sviluppo, che gunicorn.conf.py altrimenti erediterebbe
+AMBIENTE = {
+    'runserver': {'DJANGO_SETTINGS_MODULE': 'tomatoai.settings'},
+    'gunicorn': {'DJANGO_SETTINGS_MODULE': 'tomatoai.settings_prod', 'GUNICORN_WORKER_CLASS': 'sync'},
+    'uvicorn': {'DJANGO_SETTINGS_MODULE': 'tomatoai.settings_prod',
+                'GUNICORN_WORKER_CLASS': 'uvicorn.workers.UvicornWorker'},
+}
+
+
+def _porta_libera():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _richiesta(porta, url, timeout=5):
+    connessione = HTTPConnection('127.0.0.1', porta, timeout=timeout)
+    try:
+        connessione.request('GET', url)
+        risposta = connessione.getresponse()
+        risposta.read()
+        return risposta.status
+    finally:
+        connessione.close()
+
+
+class Command(BaseCommand):
+    help = ('Avvia i server indicati, misura il tempo fino alla prima risposta e '
+            'confronta il throughput su un endpoint dell\'API.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', nargs='+', choices=sorted(SERVER), default=['runserver', 'gunicorn'],
+                            help='Server da confrontare.')
+        parser.add_argument('--url', default='/restaurant_manager/ricette/',
+                            help='Endpoint da interrogare.')
+        parser.add_argument('--richieste', type=int, default=2000,
+                            help='Numero di richieste per server.')
+        parser.add_argument('--concorrenza', type=int, default=16,
+                            help='Numero di client concorrenti.')
+        parser.add_argument('--attesa-massima', type=float, default=30.0,
+                            help='Secondi massimi di attesa per l\'avvio di ciascun server.')
+
+    def handle(self, *args, **options):
+        risultati = []
+        for nome in options['server']:
+            risultati.append((nome, self._misura(nome, options)))
+
+        self.stdout.write('')
+        self.stdout.write(f'{"server":<12}{"avvio (s)":>12}{"req/s":>12}{"p50 (ms)":>12}{"p99 (ms)":>12}{"errori":>10}')
+        for nome, (avvio, throughput, p50, p99, errori) in risultati:
+            self.stdout.write(f'{nome:<12}{avvio:>12.2f}{throughput:>12.1f}{p50:>12.2f}{p99:>12.2f}{errori:>10}')
+
+    def _misura(self, nome, options):
+        porta = _porta_libera()
+        comando = [parte.format(porta=porta) for parte in SERVER[nome]]
+        ambiente = {**os.environ, **SENZA_LIMITI, **AMBIENTE[nome]}
+
+        self.stdout.write(f'Avvio {nome}: {" ".join(comando)}')
+        processo = subprocess.Popen(comando, cwd=settings.BASE_DIR, env=ambiente,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            avvio = self._attendi_avvio(processo, porta, options)
+            return (avvio, *self._carico(porta, options))
+        finally:
+            processo.terminate()
+            processo.wait()
+
+    def _attendi_avvio(self, processo, porta, options):
+        inizio = time.perf_counter()
+        while time.perf_counter() - inizio < options['attesa_massima']:
+            if processo.poll() is not None:
+                raise CommandError(f'Il server e\' terminato durante l\'avvio (codice {processo.returncode}).')
+            try:
+                _richiesta(porta, options['url'], timeout=1)
+                return time.perf_counter() - inizio
+            except OSError:
+                time.sleep(0.02)
+
+        raise CommandError('Il server non ha risposto entro il tempo massimo di attesa.')
+
+    def _carico(self, porta, options):
+        def esegui(_):
+            inizio = time.perf_counter()
+            try:
+                stato = _richiesta(porta, options['url'])
+            except OSError:
+                stato = None
+            return time.perf_counter() - inizio, stato
+
+        # Riscaldamento, esclude dalla misura il primo accesso di ciascun worker
+        with ThreadPoolExecutor(max_workers=options['concorrenza']) as pool:
+            list(pool.map(esegui, range(options['concorrenza'] * 4)))
+
+            inizio = time.perf_counter()
+            misure = list(pool.map(esegui, range(options['richieste'])))
+            durata = time.perf_counter() - inizio
+
+        latenze = sorted(latenza for latenza, stato in misure if stato == 200)
+        errori = len(misure) - len(latenze)
+        if not latenze:
+            raise CommandError('Nessuna richiesta completata con successo.')
+
+        p50 = statistics.median(latenze) * 1000
+        p99 = latenze[min(len(latenze) - 1, int(len(latenze) * 0.99))] * 1000
+        return len(latenze) / durata, p50, p99, errori
@@ -0,0 +1,70 @@
+import random
+import statistics
+import time
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand
+
+from ...similarita import IndiceSimilarita
+
+
+class Command(BaseCommand):
+    help = ('Misura costruzione, aggiornamenti e interrogazioni dell\'indice di similarita\' '
+            'su un catalogo sintetico, senza usare il database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ricette', type=int, default=100000)
+        parser.add_argument('--ingredienti', type=int, default=5000)
+        parser.add_argument('--per-ricetta', type=int, default=8,
+                            help='Ingredienti per ricetta.')
+        parser.add_argument('--interrogazioni', type=int, default=200)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--seme', type=int, default=0)
+
+    def handle(self, *args, **options):
+        casuale = random.Random(options['seme'])
+
+        # Popolarita' degli ingredienti con coda lunga: pochi ingredienti (sale,
+        # olio, pomodoro) compaiono in moltissime ricette, come nei cataloghi reali.
+        ingredienti = [f'ingrediente-{i}' for i in range(options['ingredienti'])]
+        pesi = list(accumulate(1 / (posizione + 1) for posizione in range(len(ingredienti))))
+        ricette = [f'ricetta-{i}' for i in range(options['ricette'])]
+
+        coppie = [(ricetta, ingrediente)
+                  for ricetta in ricette
+                  for ingrediente in set(casuale.choices(ingredienti, cum_weights=pesi, k=options['per_ricetta']))]
+
+        inizio = time.perf_counter()
+        indice = IndiceSimilarita(coppie)
+        costruzione = time.perf_counter() - inizio
+
+        self.stdout.write(f'Catalogo: {len(ricette)} ricette, {len(ingredienti)} ingredienti, '
+                          f'{len(coppie)} collegamenti')
+        self.stdout.write(f'Costruzione indice: {costruzione * 1e3:.0f} ms')
+
+        campione_ricette = casuale.sample(ricette, min(options['interrogazioni'], len(ricette)))
+        campione_ingredienti = casuale.choices(ingredienti, cum_weights=pesi, k=options['interrogazioni'])
+
+        self._riporta('simili', [self._cronometra(indice.simili, ricetta, options['k'])
+                                 for ricetta in campione_ricette])
+        self._riporta('abbinamenti', [self._cronometra(indice.abbinamenti, ingrediente, options['k'])
+                                      for ingrediente in campione_ingredienti])
+
+        aggiornamenti = []
+        for ricetta in campione_ricette:
+            ingrediente = casuale.choice(ingredienti)
+            aggiornamenti.append(self._cronometra(indice.collega, ricetta, ingrediente))
+            aggiornamenti.append(self._cronometra(indice.scollega, ricetta, ingrediente))
+        self._riporta('aggiornamento', aggiornamenti)
+
+    @staticmethod
+    def _cronometra(funzione, *argomenti):
+        inizio = time.perf_counter()
+        funzione(*argomenti)
+        return time.perf_counter() - inizio
+
+    def _riporta(self, nome, durate):
+        durate = sorted(durate)
+        p99 = durate[min(len(durate) - 1, int(len(durate) * 0.99))]
+        self.stdout.write(f'{nome:<14} media {statistics.fmean(durate) * 1e3:8.3f} ms   '
+                          f'p50 {statistics.median(durate) * 1e3:8.3f} ms   p99 {p99 * 1e3:8.3f} ms')
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...modifiche import compatta_registro
+
+
+class Command(BaseCommand):
+    help = ('Elimina dal registro delle modifiche quelle scadute e superate da una modifica '
+            'successiva della stessa chiave.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conservazione', type=int, default=None,
+                            help='Secondi per cui conservare tutte le modifiche '
+                                 '(predefinito: RESTAURANT_MANAGER_MODIFICHE_CONSERVAZIONE).')
+
+    def handle(self, *args, **options):
+        inizio = time.perf_counter()
+        eliminate = compatta_registro(options['conservazione'])
+        durata = time.perf_counter() - inizio
+
+        self.stdout.write(f'Eliminate {eliminate} modifiche superate in {durata * 1e3:.0f} ms')
@@ -0,0 +1,139 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from ...lavori import esegui_lavoro, preleva_lavori, recupera_lavori_scaduti, rilascia_lavori
+from ...models import Lavoro
+from ...processi import inizializza_django
+
+
+class Command(BaseCommand):
+    help = 'Esegue i lavori in coda usando un pool di processi locali, senza broker esterni.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processi', type=int, default=os.cpu_count() or 1,
+                            help='Numero di processi del pool. Con 0 i lavori vengono eseguiti nel processo corrente.')
+        parser.add_argument('--intervallo', type=float, default=1.0,
+                            help='Secondi di attesa quando la coda e\' vuota.')
+        parser.add_argument('--scadenza', type=int, default=600,
+                            help='Secondi senza aggiornamenti dopo i quali un lavoro in esecuzione viene rimesso in coda.')
+        parser.add_argument('--recupero', type=float, default=60.0,
+                            help='Secondi tra due controlli dei lavori scaduti.')
+        parser.add_argument('--una-volta', action='store_true',
+                            help='Termina quando la coda e\' vuota invece di restare in attesa.')
+
+    def handle(self, *args, **options):
+        self._prossimo_recupero = 0
+
+        if options['processi'] == 0:
+            self._esegui_in_linea(options)
+        else:
+            self._esegui_con_pool(options)
+
+    def _recupera(self, options):
+        """
+        Libera periodicamente i lavori scaduti, anche quelli lasciati da altri
+        worker terminati mentre questo era in esecuzione.
+        """
+        if time.monotonic() < self._prossimo_recupero:
+            return
+        self._prossimo_recupero = time.monotonic() + options['recupero']
+
+        rimessi, falliti = recupera_lavori_scaduti(timedelta(seconds=options['scadenza']))
+        if rimessi or falliti:
+            self.stdout.write(f'Lavori scaduti: {rimessi} rimessi in coda, {falliti} falliti.')
+
+    def _rilascia(self, pks, messaggio):
+        rimessi, falliti = rilascia_lavori(Lavoro.objects.filter(pk__in=pks), messaggio)
+        if rimessi or falliti:
+            self.stderr.write(f'Lavori {", ".join(f"#{pk}" for pk in sorted(pks))}: '
+                              f'{rimessi} rimessi in coda, {falliti} falliti.')
+
+    def _esegui_in_linea(self, options):
+        while True:
+            self._recupera(options)
+
+            prelevati = preleva_lavori(1)
+            if not prelevati:
+                if options['una_volta']:
+                    return
+                time.sleep(options['intervallo'])
+                continue
+
+            for pk in prelevati:
+                self._riporta(pk, esegui_lavoro(pk))
+
+    def _nuovo_pool(self, processi):
+        # I processi figli vengono avviati con 'spawn' per non ereditare le
+        # connessioni al database del processo principale
+        connections.close_all()
+        return ProcessPoolExecutor(max_workers=processi,
+                                   mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=inizializza_django,
+                                   initargs=(settings.SETTINGS_MODULE,))
+
+    def _esegui_con_pool(self, options):
+        processi = options['processi']
+        pool = self._nuovo_pool(processi)
+        in_corso = {}
+
+        try:
+            while True:
+                self._recupera(options)
+
+                liberi = processi - len(in_corso)
+                prelevati = preleva_lavori(liberi) if liberi else []
+
+                try:
+                    while prelevati:
+                        futuro = pool.submit(esegui_lavoro, prelevati[0])
+                        in_corso[futuro] = prelevati.pop(0)
+
+                    if not in_corso:
+                        if options['una_volta']:
+                            return
+                        time.sleep(options['intervallo'])
+                        continue
+
+                    completati, _ = wait(in_corso, timeout=options['intervallo'], return_when=FIRST_COMPLETED)
+                    for futuro in completati:
+                        pk = in_corso[futuro]
+                        try:
+                            stato = futuro.result()
+                        except BrokenProcessPool:
+                            raise
+                        except Exception as exc:
+                            # Errore fuori dal lavoro (ad esempio del database): il
+                            # lavoro non ha registrato l'esito e va liberato
+                            del in_corso[futuro]
+                            self.stderr.write(f'Lavoro #{pk}: errore del worker ({exc}).')
+                            self._rilascia([pk], f'Errore del worker: {exc}')
+                            continue
+                        del in_corso[futuro]
+                        self._riporta(pk, stato)
+
+                except BrokenProcessPool:
+                    # Un processo figlio e' terminato in modo anomalo (crash, OOM,
+                    # os._exit): il pool termina anche gli altri, quindi tutti i
+                    # lavori prelevati o in esecuzione vanno liberati e il pool
+                    # ricreato. Il lavoro responsabile non e' distinguibile dagli
+                    # altri: a ogni terminazione consuma un tentativo e alla fine
+                    # viene marcato come fallito.
+                    coinvolti = list(in_corso.values()) + prelevati
+                    self.stderr.write('Il pool di processi si e\' interrotto, viene ricreato.')
+                    self._rilascia(coinvolti, 'Worker terminato in modo anomalo durante l\'esecuzione.')
+                    in_corso.clear()
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    pool = self._nuovo_pool(processi)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _riporta(self, pk, stato):
+        self.stdout.write(f'Lavoro #{pk}: {stato}.')
@@ -0,0 +1,45 @@
+import statistics
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...profilazione import esegui_in_processo
+
+
+class Command(BaseCommand):
+    help = ('Confronta i profili di settings misurando, in processi separati, il tempo di '
+            'avvio, i moduli importati e il costo per richiesta dell\'intero stack WSGI.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profili', nargs='+', default=['tomatoai.settings_prod', 'tomatoai.settings_api'],
+                            help='Moduli di settings da confrontare.')
+        parser.add_argument('--url', default='/restaurant_manager/ingredienti/?nome_ingrediente=__misura__',
+                            help='Endpoint da servire.')
+        parser.add_argument('--richieste', type=int, default=2000,
+                            help='Richieste servite per ciascun processo.')
+        parser.add_argument('--ripetizioni', type=int, default=3,
+                            help='Processi avviati per ciascun profilo, si riporta la mediana.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"profilo":<28}{"processo (ms)":>15}{"avvio (ms)":>12}{"moduli":>8}'
+                          f'{"prima (ms)":>12}{"media (us)":>12}{"mediana (us)":>14}')
+
+        for profilo in options['profili']:
+            misure = [esegui_in_processo(settings.BASE_DIR, 'misura_processo',
+                                         profilo, options['url'], options['richieste'])
+                      for _ in range(options['ripetizioni'])]
+
+            def mediana(chiave):
+                return statistics.median(risultato[chiave] for risultato, _, _ in misure)
+
+            processo = statistics.median(durata for _, _, durata in misure)
+            stato = misure[0][0]['stato']
+            errori = sum(risultato.get('errori', 0) for risultato, _, _ in misure)
+            if stato != 200:
+                self.stderr.write(f'{profilo}: {options["url"]} ha risposto {stato}.')
+            if errori:
+                self.stderr.write(f'{profilo}: {errori} richieste successive senza risposta 200.')
+
+            self.stdout.write(f'{profilo:<28}{processo * 1e3:>15.1f}{mediana("avvio") * 1e3:>12.1f}'
+                              f'{mediana("moduli"):>8.0f}{mediana("prima_richiesta") * 1e3:>12.2f}'
+                              f'{mediana("media") * 1e6:>12.1f}{mediana("mediana") * 1e6:>14.1f}')
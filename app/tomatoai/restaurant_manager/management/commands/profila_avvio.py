@@ -0,0 +1,49 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...profilazione import analizza_importtime, categoria_modulo, esegui_in_processo
+
+
+class Command(BaseCommand):
+    help = ('Avvia un interprete nuovo con `-X importtime`, serve la prima richiesta e '
+            'riporta il costo di importazione per gruppo di moduli e per singolo modulo.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profilo', default=settings.SETTINGS_MODULE,
+                            help='Modulo di settings da profilare.')
+        parser.add_argument('--url', default='/restaurant_manager/ingredienti/?nome_ingrediente=__misura__',
+                            help='Endpoint della prima richiesta.')
+        parser.add_argument('--moduli', type=int, default=20,
+                            help='Numero di moduli piu\' costosi da elencare.')
+
+    def handle(self, *args, **options):
+        risultato, stderr, durata = esegui_in_processo(settings.BASE_DIR, 'misura_processo',
+                                                       options['profilo'], options['url'], 0,
+                                                       opzioni_python=('-X', 'importtime'))
+        tempi = analizza_importtime(stderr)
+
+        categorie = defaultdict(lambda: [0, 0])
+        for nome, proprio in tempi.items():
+            categoria = categorie[categoria_modulo(nome)]
+            categoria[0] += proprio
+            categoria[1] += 1
+
+        self.stdout.write(f'Profilo: {options["profilo"]}')
+        self.stdout.write(f'Processo fino alla prima risposta: {durata * 1e3:.1f} ms '
+                          f'(setup {risultato["avvio"] * 1e3:.1f} ms, '
+                          f'prima richiesta {risultato["prima_richiesta"] * 1e3:.1f} ms, '
+                          f'stato {risultato["stato"]})')
+        self.stdout.write(f'Moduli caricati: {risultato["moduli"]}, importazioni totali: '
+                          f'{sum(tempi.values()) / 1e3:.1f} ms')
+        self.stdout.write('')
+
+        self.stdout.write(f'{"gruppo":<36}{"moduli":>8}{"tempo (ms)":>12}')
+        for nome, (proprio, numero) in sorted(categorie.items(), key=lambda voce: -voce[1][0]):
+            self.stdout.write(f'{nome:<36}{numero:>8}{proprio / 1e3:>12.2f}')
+        self.stdout.write('')
+
+        self.stdout.write(f'{"modulo":<60}{"tempo (ms)":>12}')
+        for nome, proprio in sorted(tempi.items(), key=lambda voce: -voce[1])[:options['moduli']]:
+            self.stdout.write(f'{nome:<60}{proprio / 1e3:>12.2f}')
@@ -0,0 +1,30 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...istantanee import percorso_istantanea, pubblica_istantanea
+
+
+class Command(BaseCommand):
+    help = ('Compila ristoranti, ricette, ingredienti e collegamenti in un\'istantanea binaria '
+            'e la pubblica sostituendo atomicamente la precedente.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--percorso', default=None,
+                            help='File dell\'istantanea (predefinito: RESTAURANT_MANAGER_ISTANTANEA).')
+
+    def handle(self, *args, **options):
+        percorso = options['percorso'] or percorso_istantanea()
+        if not percorso:
+            raise CommandError('Indicare --percorso o impostare RESTAURANT_MANAGER_ISTANTANEA.')
+
+        inizio = time.perf_counter()
+        istantanea = pubblica_istantanea(percorso)
+        durata = time.perf_counter() - inizio
+
+        numeri = istantanea.numeri
+        self.stdout.write(f'Pubblicata la versione {istantanea.versione} in {percorso} '
+                          f'({os.path.getsize(percorso) / 1024:.1f} KiB, {durata * 1e3:.0f} ms): '
+                          f'{numeri["ristorante"]} ristoranti, {numeri["ricetta"]} ricette, '
+                          f'{numeri["ingrediente"]} ingredienti')
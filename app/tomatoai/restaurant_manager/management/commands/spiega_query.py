@@ -0,0 +1,71 @@
+import re
+from itertools import combinations
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router
+
+from ...views import FiltriMixin, RistoranteViewSet, RicettaViewSet, IngredienteViewSet, LavoroViewSet
+
+VIEWSET = [RistoranteViewSet, RicettaViewSet, IngredienteViewSet, LavoroViewSet]
+
+# Righe del piano che indicano la lettura completa di una tabella o di un indice
+SCANSIONI_COMPLETE = {
+    'sqlite': re.compile(r'\bSCAN (?!CONSTANT ROW)(\S+)'),
+    'postgresql': re.compile(r'\bSeq Scan on (\S+)'),
+    'mysql': re.compile(r'\btype: ALL\b|\bFull scan\b|Table scan on (\S+)'),
+}
+
+# Valore usato per ogni parametro: il piano non dipende dal valore
+VALORE = '__spiega_query__'
+
+
+class Command(BaseCommand):
+    help = ('Esegue EXPLAIN per ogni combinazione di filtri che le viste possono produrre '
+            'e segnala le scansioni complete di tabelle o indici.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--piani', action='store_true',
+                            help='Stampa il piano completo di ogni query.')
+        parser.add_argument('--fallisci', action='store_true',
+                            help='Termina con errore se una query filtrata scansiona una tabella intera.')
+
+    def handle(self, *args, **options):
+        problemi = 0
+
+        for viewset in VIEWSET:
+            assert issubclass(viewset, FiltriMixin)
+            modello = viewset.queryset.model
+            connessione = connections[router.db_for_read(modello)]
+            scansione = SCANSIONI_COMPLETE.get(connessione.vendor)
+            if scansione is None:
+                raise CommandError(f'Database "{connessione.vendor}" non supportato.')
+
+            self.stdout.write(self.style.MIGRATE_HEADING(viewset.__name__))
+
+            parametri = list(viewset.filtri)
+            for numero in range(len(parametri) + 1):
+                for combinazione in combinations(parametri, numero):
+                    queryset = viewset.filtra(viewset.queryset.all(), {parametro: VALORE for parametro in combinazione})
+                    piano = queryset.explain()
+                    tabelle = sorted({corrispondenza.group(0) for corrispondenza in scansione.finditer(piano)})
+
+                    descrizione = ', '.join(combinazione) or '(nessun filtro)'
+                    if not tabelle:
+                        esito = self.style.SUCCESS('OK')
+                    elif not combinazione:
+                        # Senza filtri la lista completa e' attesa
+                        esito = self.style.WARNING('SCANSIONE COMPLETA (attesa): ' + '; '.join(tabelle))
+                    else:
+                        problemi += 1
+                        esito = self.style.ERROR('SCANSIONE COMPLETA: ' + '; '.join(tabelle))
+
+                    self.stdout.write(f'  {descrizione:<60} {esito}')
+                    if options['piani']:
+                        for riga in piano.splitlines():
+                            self.stdout.write(f'      {riga}')
+
+        self.stdout.write('')
+        self.stdout.write(f'Query filtrate con scansioni complete: {problemi}')
+
+        if problemi and options['fallisci']:
+            raise CommandError('Alcune query filtrate scansionano tabelle intere.')
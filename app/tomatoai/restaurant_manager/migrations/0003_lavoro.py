@@ -0,0 +1,35 @@
+# Generated by Django 5.0.3 on 2026-10-19 13:21
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant_manager', '0002_ingrediente_produttore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lavoro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50)),
+                ('parametri', models.JSONField(blank=True, default=dict)),
+                ('stato', models.CharField(choices=[('in_coda', 'In coda'), ('in_esecuzione', 'In esecuzione'), ('completato', 'Completato'), ('fallito', 'Fallito')], default='in_coda', max_length=20)),
+                ('progresso', models.PositiveSmallIntegerField(default=0)),
+                ('messaggio', models.CharField(blank=True, default='', max_length=255)),
+                ('risultato', models.JSONField(blank=True, null=True)),
+                ('tentativi', models.PositiveSmallIntegerField(default=0)),
+                ('max_tentativi', models.PositiveSmallIntegerField(default=3)),
+                ('disponibile_da', models.DateTimeField(default=django.utils.timezone.now)),
+                ('creato', models.DateTimeField(auto_now_add=True)),
+                ('aggiornato', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'lavori',
+                'indexes': [models.Index(fields=['stato', 'disponibile_da'], name='restaurant__stato_27d3c7_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.3 on 2026-10-19 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant_manager', '0003_lavoro'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Modifica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modello', models.CharField(max_length=20)),
+                ('chiave', models.CharField(max_length=100)),
+                ('operazione', models.CharField(choices=[('salvato', 'Salvato'), ('eliminato', 'Eliminato'), ('collegato', 'Collegato'), ('scollegato', 'Scollegato')], max_length=10)),
+                ('campo', models.CharField(blank=True, default='', max_length=20)),
+                ('collegato', models.CharField(blank=True, default='', max_length=100)),
+                ('creato', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'modifiche',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.3 on 2026-10-19 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant_manager', '0004_modifica'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingrediente',
+            name='produttore',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='ristorante',
+            name='indirizzo',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='lavoro',
+            index=models.Index(fields=['tipo', 'stato'], name='restaurant__tipo_c2fefd_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-19 13:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant_manager', '0005_indici_filtri'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='modifica',
+            index=models.Index(fields=['modello', 'chiave', 'campo', 'collegato', 'id'], name='restaurant__modello_d55973_idx'),
+        ),
+    ]
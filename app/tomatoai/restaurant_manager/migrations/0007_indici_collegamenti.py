@@ -0,0 +1,83 @@
+# Generated by Django 5.0.3 on 2026-10-19 14:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Indici creati con RunSQL dalle prime versioni di 0005_indici_filtri: lo stato
+# dei modelli non li conosceva, quindi una ricostruzione della tabella su SQLite
+# li perdeva. Ora sono dichiarati nei Meta.indexes dei modelli intermedi.
+INDICI_SQL = [
+    ('restaurant_manager_ricetta_ingredienti', 'restaurant_ricetta_ingr_inv_idx'),
+    ('restaurant_manager_ristorante_ricette', 'restaurant_ristor_ricette_inv_idx'),
+]
+
+
+def elimina_indici_sql(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        for tabella, nome in INDICI_SQL:
+            if nome in connection.introspection.get_constraints(cursor, tabella):
+                schema_editor.execute(schema_editor.sql_delete_index % {
+                    'table': schema_editor.quote_name(tabella),
+                    'name': schema_editor.quote_name(nome),
+                })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant_manager', '0006_modifica_chiave'),
+    ]
+
+    # I modelli intermedi usano le tabelle gia' create per i ManyToMany: cambia
+    # solo lo stato, poi gli indici si aggiungono come su ogni altro modello.
+    operations = [
+        migrations.RunPython(elimina_indici_sql, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='RicettaIngrediente',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('ingrediente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='restaurant_manager.ingrediente')),
+                        ('ricetta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='restaurant_manager.ricetta')),
+                    ],
+                    options={
+                        'db_table': 'restaurant_manager_ricetta_ingredienti',
+                        'unique_together': {('ricetta', 'ingrediente')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='ricetta',
+                    name='ingredienti',
+                    field=models.ManyToManyField(blank=True, related_name='ricette', through='restaurant_manager.RicettaIngrediente', to='restaurant_manager.ingrediente'),
+                ),
+                migrations.CreateModel(
+                    name='RistoranteRicetta',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('ricetta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='restaurant_manager.ricetta')),
+                        ('ristorante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='restaurant_manager.ristorante')),
+                    ],
+                    options={
+                        'db_table': 'restaurant_manager_ristorante_ricette',
+                        'unique_together': {('ristorante', 'ricetta')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='ristorante',
+                    name='ricette',
+                    field=models.ManyToManyField(blank=True, related_name='ristoranti', through='restaurant_manager.RistoranteRicetta', to='restaurant_manager.ricetta'),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ricettaingrediente',
+            index=models.Index(fields=['ingrediente', 'ricetta'], name='restaurant__ingredi_8945fd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ristorantericetta',
+            index=models.Index(fields=['ricetta', 'ristorante'], name='restaurant__ricetta_0be886_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
     
@@ -9,7 +10,7 @@ class Ingrediente(models.Model):
     nome = models.CharField(max_length=100,
                             primary_key=True)
     
-    produttore = models.CharField(max_length=100)
+    produttore = models.CharField(max_length=100, db_index=True)
     
     # Utils
     def __str__(self) -> str:
@@ -26,7 +27,8 @@ class Ricetta(models.Model):
     # Ricette che usano l-ingrediente
     ingredienti = models.ManyToManyField(Ingrediente, 
                                          blank=True,
-                                         related_name='ricette')
+                                         related_name='ricette',
+                                         through='RicettaIngrediente')
 
     # Utils
     def __str__(self) -> str:
@@ -39,14 +41,139 @@ class Ristorante(models.Model):
     # Nome del ristorante
     nome = models.CharField(max_length=100,
                             primary_key=True)
-    indirizzo = models.CharField(max_length=100)
+    indirizzo = models.CharField(max_length=100, db_index=True)
 
     # Ricette associate al ristorante
     ricette = models.ManyToManyField(Ricetta, 
                                      blank=True,
-                                     related_name='ristoranti')
+                                     related_name='ristoranti',
+                                     through='RistoranteRicetta')
 
     # Utils
     def __str__(self) -> str:
         return self.nome 
 
+
+# Le tabelle intermedie dei ManyToMany sono dichiarate solo per indicizzarle:
+# hanno le stesse tabelle e colonne di quelle create automaticamente, senza campi
+# aggiuntivi, quindi .add(), .set() e .remove() funzionano come prima. Gli indici
+# composti partono dalla destinazione e coprono le ricerche inverse (ricette di
+# un ingrediente, ristoranti di una ricetta).
+
+class RicettaIngrediente(models.Model):
+    """
+    Un ingrediente di una ricetta
+    """
+    ricetta = models.ForeignKey(Ricetta, on_delete=models.CASCADE, related_name='+')
+    ingrediente = models.ForeignKey(Ingrediente, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        db_table = 'restaurant_manager_ricetta_ingredienti'
+        unique_together = [('ricetta', 'ingrediente')]
+        indexes = [
+            models.Index(fields=['ingrediente', 'ricetta']),
+        ]
+
+
+class RistoranteRicetta(models.Model):
+    """
+    Una ricetta di un ristorante
+    """
+    ristorante = models.ForeignKey(Ristorante, on_delete=models.CASCADE, related_name='+')
+    ricetta = models.ForeignKey(Ricetta, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        db_table = 'restaurant_manager_ristorante_ricette'
+        unique_together = [('ristorante', 'ricetta')]
+        indexes = [
+            models.Index(fields=['ricetta', 'ristorante']),
+        ]
+
+
+
+class Lavoro(models.Model):
+    """
+    Un lavoro pesante (importazioni, ricostruzioni) da eseguire in background
+    tramite il comando `manage.py esegui_lavori`
+    """
+    IN_CODA = 'in_coda'
+    IN_ESECUZIONE = 'in_esecuzione'
+    COMPLETATO = 'completato'
+    FALLITO = 'fallito'
+
+    STATI = [
+        (IN_CODA, 'In coda'),
+        (IN_ESECUZIONE, 'In esecuzione'),
+        (COMPLETATO, 'Completato'),
+        (FALLITO, 'Fallito'),
+    ]
+
+    # Tipo di lavoro, deve essere una chiave di lavori.TIPI_LAVORO
+    tipo = models.CharField(max_length=50)
+    parametri = models.JSONField(default=dict, blank=True)
+
+    # Stato di avanzamento
+    stato = models.CharField(max_length=20, choices=STATI, default=IN_CODA)
+    progresso = models.PositiveSmallIntegerField(default=0)
+    messaggio = models.CharField(max_length=255, blank=True, default='')
+    risultato = models.JSONField(null=True, blank=True)
+
+    # Tentativi
+    tentativi = models.PositiveSmallIntegerField(default=0)
+    max_tentativi = models.PositiveSmallIntegerField(default=3)
+    disponibile_da = models.DateTimeField(default=timezone.now)
+
+    creato = models.DateTimeField(auto_now_add=True)
+    aggiornato = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'lavori'
+        indexes = [
+            models.Index(fields=['stato', 'disponibile_da']),
+            models.Index(fields=['tipo', 'stato']),
+        ]
+
+    # Utils
+    def __str__(self) -> str:
+        return f'{self.tipo} #{self.pk} ({self.stato})'
+
+
+class Modifica(models.Model):
+    """
+    Una modifica a ristoranti, ricette o ingredienti, registrata per il feed
+    incrementale delle modifiche. L'id fa da cursore per i client: l'ordine
+    degli id e' quello di conferma solo su SQLite (vedi modifiche.cursore_sicuro).
+    """
+    SALVATO = 'salvato'
+    ELIMINATO = 'eliminato'
+    COLLEGATO = 'collegato'
+    SCOLLEGATO = 'scollegato'
+
+    OPERAZIONI = [
+        (SALVATO, 'Salvato'),
+        (ELIMINATO, 'Eliminato'),
+        (COLLEGATO, 'Collegato'),
+        (SCOLLEGATO, 'Scollegato'),
+    ]
+
+    # Oggetto modificato, es. ('ricetta', 'Pizza Margherita')
+    modello = models.CharField(max_length=20)
+    chiave = models.CharField(max_length=100)
+    operazione = models.CharField(max_length=10, choices=OPERAZIONI)
+
+    # Solo per i collegamenti: campo ManyToMany e chiave dell'oggetto collegato
+    campo = models.CharField(max_length=20, blank=True, default='')
+    collegato = models.CharField(max_length=100, blank=True, default='')
+
+    creato = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'modifiche'
+        indexes = [
+            # Righe successive con la stessa chiave, per la compattazione del registro
+            models.Index(fields=['modello', 'chiave', 'campo', 'collegato', 'id']),
+        ]
+
+    # Utils
+    def __str__(self) -> str:
+        return f'#{self.pk} {self.operazione} {self.modello} {self.chiave}'
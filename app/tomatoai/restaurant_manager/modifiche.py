@@ -0,0 +1,258 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Exists, Max, OuterRef
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Ristorante, Ricetta, Ingrediente, Modifica
+
+# Secondi per cui il registro conserva tutte le modifiche: dopo, quelle superate
+# da una modifica successiva della stessa chiave possono essere compattate
+CONSERVAZIONE_PREDEFINITA = 7 * 24 * 3600
+
+# Secondi dopo i quali le modifiche vengono esposte ai lettori sui database
+# diversi da SQLite (vedi cursore_sicuro)
+RITARDO_PREDEFINITO = 5
+
+# Id del registro esaminati per ogni istruzione di compattazione
+LOTTO_COMPATTAZIONE = 10000
+
+MODELLI = {modello._meta.model_name: modello for modello in (Ristorante, Ricetta, Ingrediente)}
+
+# Campi ManyToMany tracciati: i collegamenti vengono sempre registrati dal lato
+# del modello che dichiara il campo, anche quando sono modificati dal lato inverso
+# (es. ingrediente.ricette.add(...)).
+CAMPI_COLLEGAMENTO = {
+    Ricetta.ingredienti.through: (Ricetta, 'ingredienti'),
+    Ristorante.ricette.through: (Ristorante, 'ricette'),
+}
+
+
+def registra_salvataggi(modello, chiavi):
+    """
+    Registra come salvati gli oggetti scritti senza passare da save(), ad esempio
+    con bulk_create, che non invia post_save.
+    """
+    Modifica.objects.bulk_create([
+        Modifica(modello=modello._meta.model_name, chiave=chiave, operazione=Modifica.SALVATO)
+        for chiave in chiavi
+    ])
+
+
+@receiver(post_save, sender=Ristorante)
+@receiver(post_save, sender=Ricetta)
+@receiver(post_save, sender=Ingrediente)
+def _oggetto_salvato(sender, instance, **kwargs):
+    Modifica.objects.create(modello=sender._meta.model_name,
+                            chiave=instance.pk,
+                            operazione=Modifica.SALVATO)
+
+
+@receiver(post_delete, sender=Ristorante)
+@receiver(post_delete, sender=Ricetta)
+@receiver(post_delete, sender=Ingrediente)
+def _oggetto_eliminato(sender, instance, **kwargs):
+    # I collegamenti dell'oggetto vengono eliminati in cascata senza m2m_changed:
+    # i client devono rimuoverli quando ricevono l'eliminazione.
+    Modifica.objects.create(modello=sender._meta.model_name,
+                            chiave=instance.pk,
+                            operazione=Modifica.ELIMINATO)
+
+
+@receiver(m2m_changed, sender=Ricetta.ingredienti.through)
+@receiver(m2m_changed, sender=Ristorante.ricette.through)
+def _collegamenti_modificati(sender, instance, action, reverse, pk_set, **kwargs):
+    modello, nome_campo = CAMPI_COLLEGAMENTO[sender]
+    campo = modello._meta.get_field(nome_campo)
+
+    if action == 'post_add':
+        operazione = Modifica.COLLEGATO
+    elif action == 'post_remove':
+        operazione = Modifica.SCOLLEGATO
+    elif action == 'pre_clear':
+        # Dopo clear() i collegamenti non sono piu' leggibili: vanno registrati prima
+        colonna_istanza = campo.m2m_reverse_field_name() if reverse else campo.m2m_field_name()
+        colonna_altri = campo.m2m_field_name() if reverse else campo.m2m_reverse_field_name()
+        pk_set = set(sender.objects
+                     .filter(**{f'{colonna_istanza}_id': instance.pk})
+                     .values_list(f'{colonna_altri}_id', flat=True))
+        operazione = Modifica.SCOLLEGATO
+    else:
+        return
+
+    if reverse:
+        coppie = [(pk, instance.pk) for pk in pk_set]
+    else:
+        coppie = [(instance.pk, pk) for pk in pk_set]
+
+    Modifica.objects.bulk_create([
+        Modifica(modello=modello._meta.model_name,
+                 chiave=chiave,
+                 operazione=operazione,
+                 campo=nome_campo,
+                 collegato=collegato)
+        for chiave, collegato in coppie
+    ])
+
+
+def _dati_oggetti(modello, chiavi):
+    """
+    Ritorna i campi semplici degli oggetti indicati, esclusi i ManyToMany che
+    viaggiano nel feed come modifiche di collegamento.
+    """
+    campi = [campo.attname for campo in modello._meta.concrete_fields]
+    return {dati['pk']: dati for dati in
+            modello.objects.filter(pk__in=chiavi).values('pk', *campi)}
+
+
+def cursore_sicuro():
+    """
+    Ritorna l'id massimo del registro che i lettori (il feed e le viste in
+    memoria) possono raggiungere senza rischiare di saltare delle modifiche.
+
+    Gli id vengono assegnati all'inserimento, non alla conferma della
+    transazione: su PostgreSQL o MySQL la riga 11 puo' essere confermata prima
+    della 10, e un lettore che nel frattempo ha spostato il cursore a 11 non
+    vedrebbe mai la 10. Solo su SQLite, che serializza le scritture, l'ordine
+    degli id e' quello di conferma. Sugli altri database vengono esposte solo le
+    righe create da almeno RESTAURANT_MANAGER_MODIFICHE_RITARDO secondi: le
+    transazioni che scrivono nel registro e restano aperte piu' a lungo possono
+    comunque essere saltate.
+    """
+    ritardo = getattr(settings, 'RESTAURANT_MANAGER_MODIFICHE_RITARDO', None)
+    if ritardo is None:
+        vendor = connections[router.db_for_read(Modifica)].vendor
+        ritardo = 0 if vendor == 'sqlite' else RITARDO_PREDEFINITO
+
+    righe = Modifica.objects.all()
+    if ritardo:
+        # Si scorrono all'indietro solo le righe degli ultimi `ritardo` secondi
+        righe = righe.filter(creato__lte=timezone.now() - timedelta(seconds=ritardo))
+    return righe.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+def modifiche_dal(cursore, limite):
+    """
+    Ritorna le modifiche successive al cursore, compattate per chiave: per ogni
+    oggetto (o collegamento) viene riportata solo l'ultima operazione della
+    pagina, preceduta dall'ultima eliminazione dell'oggetto se e' stato eliminato
+    e ricreato. Gli oggetti salvati includono i loro dati attuali.
+
+    Ogni pagina compatta al piu' `limite` id consecutivi del registro, a partire
+    dal primo successivo al cursore, quindi il suo costo non dipende da quante
+    modifiche restano da leggere. Una chiave modificata in pagine diverse compare
+    in ciascuna: vale l'ultima ricevuta.
+
+    Ritorna (modifiche, nuovo_cursore, altre), dove `altre` indica che ci sono
+    altre modifiche dopo il nuovo cursore. Il cursore non supera mai
+    cursore_sicuro().
+    """
+    massimo = cursore_sicuro()
+    primo = (Modifica.objects.filter(pk__gt=cursore, pk__lte=massimo)
+             .order_by('pk').values_list('pk', flat=True).first())
+    if primo is None:
+        return [], cursore, False
+
+    fine = min(primo + limite - 1, massimo)
+
+    finestra = Modifica.objects.filter(pk__gte=primo, pk__lte=fine)
+    ultime = set(finestra
+                 .values('modello', 'chiave', 'campo', 'collegato')
+                 .annotate(ultima=Max('pk'))
+                 .values_list('ultima', flat=True))
+    # Un'eliminazione seguita da un nuovo salvataggio della stessa chiave va
+    # comunque riportata: implica la rimozione dei collegamenti precedenti, che
+    # non hanno una modifica propria. Basta l'ultima, perche' i collegamenti
+    # riportati prima di lei appartengono a vite precedenti dell'oggetto.
+    ultime.update(finestra
+                  .filter(operazione=Modifica.ELIMINATO)
+                  .values('modello', 'chiave')
+                  .annotate(ultima=Max('pk'))
+                  .values_list('ultima', flat=True))
+    ultime = sorted(ultime)
+
+    righe = Modifica.objects.in_bulk(ultime)
+
+    salvati = {}
+    for riga in righe.values():
+        if riga.operazione == Modifica.SALVATO:
+            salvati.setdefault(riga.modello, []).append(riga.chiave)
+    dati = {nome: _dati_oggetti(MODELLI[nome], chiavi) for nome, chiavi in salvati.items()}
+
+    modifiche = []
+    for pk in ultime:
+        riga = righe[pk]
+        modifica = {
+            'cursore': riga.pk,
+            'modello': riga.modello,
+            'chiave': riga.chiave,
+            'operazione': riga.operazione,
+        }
+
+        if riga.campo:
+            modifica['campo'] = riga.campo
+            modifica['collegato'] = riga.collegato
+        elif riga.operazione == Modifica.SALVATO:
+            oggetto = dati[riga.modello].get(riga.chiave)
+            if oggetto is None:
+                # Eliminato dopo la lettura delle modifiche, l'eliminazione arrivera' col prossimo cursore
+                continue
+            del oggetto['pk']
+            modifica['dati'] = oggetto
+
+        modifiche.append(modifica)
+
+    return modifiche, fine, fine < massimo
+
+
+def compatta_registro(conservazione=None, progresso=None):
+    """
+    Elimina dal registro le modifiche piu' vecchie di `conservazione` secondi
+    (predefinito RESTAURANT_MANAGER_MODIFICHE_CONSERVAZIONE) superate da una
+    modifica successiva della stessa chiave, e ritorna quante ne ha eliminate.
+
+    Il feed riporta comunque solo l'ultima modifica di ogni chiave e le viste in
+    memoria applicano le modifiche in modo idempotente, quindi nessun lettore
+    perde informazioni. Fanno eccezione le eliminazioni: implicano la rimozione
+    dei collegamenti dell'oggetto e restano anche se l'oggetto viene ricreato.
+    """
+    if conservazione is None:
+        conservazione = getattr(settings, 'RESTAURANT_MANAGER_MODIFICHE_CONSERVAZIONE', CONSERVAZIONE_PREDEFINITA)
+    scadenza = timezone.now() - timedelta(seconds=conservazione)
+
+    # Gli id crescono con la data di creazione: si cerca l'ultimo scaduto partendo dal fondo
+    orizzonte = (Modifica.objects.filter(creato__lt=scadenza)
+                 .order_by('-pk').values_list('pk', flat=True).first())
+    inizio = Modifica.objects.order_by('pk').values_list('pk', flat=True).first()
+    if orizzonte is None or inizio is None:
+        return 0
+
+    successive = Modifica.objects.filter(modello=OuterRef('modello'), chiave=OuterRef('chiave'),
+                                         campo=OuterRef('campo'), collegato=OuterRef('collegato'),
+                                         pk__gt=OuterRef('pk'))
+
+    eliminate = 0
+    primo = inizio
+    while inizio <= orizzonte:
+        fine = min(inizio + LOTTO_COMPATTAZIONE - 1, orizzonte)
+        eliminate += (Modifica.objects
+                      .filter(pk__gte=inizio, pk__lte=fine)
+                      .exclude(operazione=Modifica.ELIMINATO)
+                      .filter(Exists(successive))
+                      .delete())[0]
+        if progresso is not None:
+            progresso(100 * (fine - primo + 1) / (orizzonte - primo + 1), f'{eliminate} modifiche eliminate')
+        inizio = fine + 1
+
+    return eliminate
+
+
+def compatta_modifiche(parametri, progresso):
+    """
+    Lavoro 'compatta_modifiche': compatta il registro delle modifiche, con la
+    conservazione dei parametri o quella configurata.
+    """
+    return {'eliminate': compatta_registro(parametri.get('conservazione'), progresso)}
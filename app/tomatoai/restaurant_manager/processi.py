@@ -0,0 +1,15 @@
+import os
+
+
+def inizializza_django(modulo_settings):
+    """
+    Prepara Django in un processo avviato con 'spawn', che non eredita ne' le
+    connessioni al database ne' il registro delle app del processo principale.
+
+    Questo modulo non deve importare modelli: viene caricato nel processo figlio
+    prima che il registro delle app sia pronto.
+    """
+    import django
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = modulo_settings
+    django.setup()
@@ -0,0 +1,127 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+
+# Questo modulo viene eseguito anche in processi figli prima che Django sia
+# configurato: non deve importare modelli o altri moduli dell'app a livello di modulo.
+
+
+def _ambiente_wsgi(url):
+    percorso, _, query = url.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': percorso,
+        'QUERY_STRING': query,
+        'wsgi.input': BytesIO(),
+    }
+    setup_testing_defaults(environ)
+    return environ
+
+
+def _servi(applicazione, url):
+    """
+    Serve una richiesta GET attraverso l'intero stack WSGI e ritorna lo stato.
+    """
+    stato = []
+
+    def start_response(status, headers, exc_info=None):
+        stato.append(int(status.split(' ', 1)[0]))
+
+    risposta = applicazione(_ambiente_wsgi(url), start_response)
+    try:
+        for _ in risposta:
+            pass
+    finally:
+        if hasattr(risposta, 'close'):
+            risposta.close()
+
+    return stato[0]
+
+
+def misura_processo(modulo_settings, url, richieste):
+    """
+    Eseguita in un processo nuovo: misura il tempo di avvio di Django con il
+    profilo indicato, il tempo della prima richiesta e il costo medio delle
+    richieste successive. Stampa i risultati come JSON su stdout.
+    """
+    inizio = time.perf_counter()
+    os.environ['DJANGO_SETTINGS_MODULE'] = modulo_settings
+
+    from django.core.wsgi import get_wsgi_application
+
+    applicazione = get_wsgi_application()
+    avvio = time.perf_counter() - inizio
+
+    inizio = time.perf_counter()
+    stato = _servi(applicazione, url)
+    prima_richiesta = time.perf_counter() - inizio
+
+    durate = []
+    errori = 0
+    for _ in range(richieste):
+        inizio = time.perf_counter()
+        if _servi(applicazione, url) != 200:
+            errori += 1
+        durate.append(time.perf_counter() - inizio)
+
+    print(json.dumps({
+        'avvio': avvio,
+        'prima_richiesta': prima_richiesta,
+        'stato': stato,
+        'errori': errori,
+        'moduli': len(sys.modules),
+        'media': statistics.fmean(durate) if durate else 0.0,
+        'mediana': statistics.median(durate) if durate else 0.0,
+    }))
+
+
+def esegui_in_processo(cwd, funzione, *argomenti, opzioni_python=()):
+    """
+    Esegue `funzione` di questo modulo in un interprete nuovo e ritorna il
+    risultato JSON stampato, lo stderr e la durata complessiva del processo.
+    Nel processo i limiti di richieste dell'API sono disattivati, altrimenti le
+    misure riguarderebbero soprattutto le risposte 429.
+    """
+    codice = f'from restaurant_manager.profilazione import {funzione}; {funzione}(*{argomenti!r})'
+
+    inizio = time.perf_counter()
+    completato = subprocess.run([sys.executable, *opzioni_python, '-c', codice],
+                                cwd=cwd, env={**os.environ, 'DJANGO_RATE_LIMITS': 'off'},
+                                capture_output=True, text=True, check=True)
+    durata = time.perf_counter() - inizio
+
+    return json.loads(completato.stdout.strip().splitlines()[-1]), completato.stderr, durata
+
+
+def categoria_modulo(nome):
+    """
+    Raggruppa i moduli per il report dei tempi di importazione.
+    """
+    if nome.startswith('django.contrib.'):
+        return '.'.join(nome.split('.')[:3])
+    for prefisso in ('restaurant_manager', 'tomatoai', 'rest_framework', 'django'):
+        if nome == prefisso or nome.startswith(prefisso + '.'):
+            return prefisso
+    return 'altro'
+
+
+def analizza_importtime(stderr):
+    """
+    Estrae dall'output di `python -X importtime` il tempo proprio (in
+    microsecondi) di ciascun modulo, esclusi i moduli importati al suo interno.
+    """
+    tempi = {}
+    for riga in stderr.splitlines():
+        if not riga.startswith('import time:') or 'self [us]' in riga:
+            continue
+        proprio, _, nome = riga[len('import time:'):].split('|')
+        nome = nome.strip()
+        # Il modulo che esegue la misura non fa parte dell'applicazione
+        if nome != __name__:
+            tempi[nome] = tempi.get(nome, 0) + int(proprio)
+    return tempi
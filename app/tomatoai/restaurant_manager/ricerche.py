@@ -0,0 +1,32 @@
+import re
+
+from django.db.models import CharField
+from django.db.models.lookups import StartsWith
+
+
+def _escapa_glob(valore):
+    # In GLOB i caratteri speciali si confrontano letteralmente dentro una classe
+    return re.sub(r'([*?[])', r'[\1]', valore)
+
+
+@CharField.register_lookup
+class Prefisso(StartsWith):
+    """
+    Ricerca per prefisso, distinguendo maiuscole e minuscole, che puo' usare
+    l'indice ordinario della colonna (o la chiave primaria) su tutti i database.
+
+    istartswith (il '^' di search_fields dell'admin) confronta UPPER(colonna) su
+    PostgreSQL e usa LIKE su SQLite, che ignora maiuscole e minuscole: in entrambi
+    i casi l'indice non e' utilizzabile e la tabella viene scansionata. Su
+    PostgreSQL LIKE 'prefisso%' usa gli indici varchar_pattern_ops che Django crea
+    per le colonne CharField indicizzate; su SQLite si usa GLOB, che distingue
+    maiuscole e minuscole e sfrutta l'indice come un intervallo.
+    """
+    lookup_name = 'prefisso'
+
+    def as_sqlite(self, compiler, connection):
+        if hasattr(self.rhs, 'resolve_expression'):
+            return self.as_sql(compiler, connection)
+
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+        return f'{lhs_sql} GLOB %s', [*lhs_params, _escapa_glob(self.rhs) + '*']
@@ -1,5 +1,31 @@
-from rest_framework.serializers import ModelSerializer
-from .models import Ricetta, Ristorante, Ingrediente
+from rest_framework.serializers import ModelSerializer, Serializer, ListField, CharField, PrimaryKeyRelatedField, ValidationError
+from .models import Ricetta, Ristorante, Ingrediente, Lavoro
+from .collegamenti import aggiorna_collegamenti, istanza_bloccata
+from .lavori import TIPI_LAVORO, ParametriNonValidi, valida_parametri
+
+
+class CollegamentiDiffMixin:
+    """
+    Aggiorna i campi ManyToMany applicando solo la differenza rispetto allo stato
+    attuale, invece di passare da .set() come fa ModelSerializer.update. Campi e
+    collegamenti vengono salvati nella stessa transazione, con l'istanza bloccata.
+    """
+
+    def update(self, instance, validated_data):
+        campi_m2m = {
+            campo.name: validated_data.pop(campo.name)
+            for campo in instance._meta.many_to_many
+            if campo.name in validated_data
+        }
+
+        with istanza_bloccata(instance):
+            instance = super().update(instance, validated_data)
+
+            for nome_campo, oggetti in campi_m2m.items():
+                aggiorna_collegamenti(instance, nome_campo, oggetti)
+
+        return instance
+
 
 class IngredienteSerializer(ModelSerializer):
 
@@ -7,16 +33,48 @@ class IngredienteSerializer(ModelSerializer):
         model = Ingrediente
         fields = '__all__'
 
-class RicettaSerializer(ModelSerializer):
+class RicettaSerializer(CollegamentiDiffMixin, ModelSerializer):
     ingrediente = IngredienteSerializer(many=True, read_only=True)
+    # Dichiarato perche' ModelSerializer rende di sola lettura i ManyToMany con un
+    # modello intermedio esplicito (vedi models.RicettaIngrediente)
+    ingredienti = PrimaryKeyRelatedField(many=True, required=False, queryset=Ingrediente.objects.all())
 
     class Meta:
         model = Ricetta
         fields = "__all__"
 
-class RistoranteSerializer(ModelSerializer):
+class RistoranteSerializer(CollegamentiDiffMixin, ModelSerializer):
     ricetta = RicettaSerializer(many=True, read_only=True)
+    ricette = PrimaryKeyRelatedField(many=True, required=False, queryset=Ricetta.objects.all())
 
     class Meta:
         model = Ristorante
         fields = "__all__"
+
+class CollegamentiIngredientiSerializer(Serializer):
+    """
+    Corpo delle richieste che aggiungono o rimuovono ingredienti da una ricetta.
+    """
+    ingredienti = ListField(child=CharField(max_length=100), allow_empty=False)
+
+class LavoroSerializer(ModelSerializer):
+
+    class Meta:
+        model = Lavoro
+        fields = ['id', 'tipo', 'parametri', 'max_tentativi', 'stato', 'progresso',
+                  'messaggio', 'risultato', 'tentativi', 'creato', 'aggiornato']
+        read_only_fields = ['stato', 'progresso', 'messaggio', 'risultato',
+                            'tentativi', 'creato', 'aggiornato']
+
+    def validate_tipo(self, value):
+        if value not in TIPI_LAVORO:
+            raise ValidationError(f'Tipo di lavoro "{value}" sconosciuto.')
+        return value
+
+    def validate(self, attrs):
+        # Un lavoro con parametri malformati verrebbe accettato e poi ritentato invano
+        try:
+            valida_parametri(attrs['tipo'], attrs.get('parametri') or {})
+        except ParametriNonValidi as exc:
+            raise ValidationError({'parametri': str(exc)})
+        return attrs
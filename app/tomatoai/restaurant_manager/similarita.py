@@ -0,0 +1,240 @@
+import heapq
+import threading
+from collections import Counter, defaultdict
+
+from django.db import connections
+from django.db.models import Q
+
+from .models import Ricetta, Modifica
+from .modifiche import cursore_sicuro
+
+
+class IndiceSimilarita:
+    """
+    Matrice di incidenza ricette-ingredienti in memoria, memorizzata in forma
+    sparsa in entrambe le direzioni (ricetta -> ingredienti e ingrediente -> ricette).
+
+    Le intersezioni tra una ricetta e tutte le altre sono una riga del prodotto
+    A * A^T e vengono calcolate accumulando in un Counter (ciclo in C) le liste
+    delle ricette di ciascun ingrediente: il costo dipende solo dalle ricette che
+    condividono almeno un ingrediente, non dal numero totale di ricette.
+
+    Gli abbinamenti degli ingredienti, costosi per quelli molto diffusi e limitati
+    dal numero di ingredienti, restano in cache fino alla modifica successiva.
+    """
+
+    def __init__(self, coppie=(), cursore=0):
+        self.ingredienti_di = defaultdict(set)
+        self.ricette_di = defaultdict(set)
+        self.cursore = cursore
+        self._abbinamenti = {}
+
+        for ricetta, ingrediente in coppie:
+            self.collega(ricetta, ingrediente)
+
+    # Aggiornamenti incrementali
+
+    def collega(self, ricetta, ingrediente):
+        self._abbinamenti.clear()
+        self.ingredienti_di[ricetta].add(ingrediente)
+        self.ricette_di[ingrediente].add(ricetta)
+
+    def scollega(self, ricetta, ingrediente):
+        self._abbinamenti.clear()
+        self.ingredienti_di[ricetta].discard(ingrediente)
+        self.ricette_di[ingrediente].discard(ricetta)
+
+    def elimina_ricetta(self, ricetta):
+        self._abbinamenti.clear()
+        for ingrediente in self.ingredienti_di.pop(ricetta, ()):
+            self.ricette_di[ingrediente].discard(ricetta)
+
+    def elimina_ingrediente(self, ingrediente):
+        self._abbinamenti.clear()
+        for ricetta in self.ricette_di.pop(ingrediente, ()):
+            self.ingredienti_di[ricetta].discard(ingrediente)
+
+    # Interrogazioni
+
+    def simili(self, ricetta, k):
+        """
+        Ritorna le k ricette piu' simili a quella indicata secondo l'indice di
+        Jaccard sugli ingredienti, come lista di coppie (nome, similarita').
+        """
+        ingredienti = self.ingredienti_di.get(ricetta)
+        if not ingredienti:
+            return []
+
+        intersezioni = Counter()
+        for ingrediente in ingredienti:
+            intersezioni.update(self.ricette_di[ingrediente])
+        del intersezioni[ricetta]
+
+        # Le candidate vengono visitate per ingredienti in comune decrescenti: con c
+        # ingredienti in comune la similarita' e' al massimo c / len(ingredienti), quindi
+        # ci si ferma appena nessuna candidata rimasta puo' entrare tra le prime k.
+        numero = len(ingredienti)
+        soglia = []
+        candidate = []
+        for altra, comuni in intersezioni.most_common():
+            if len(soglia) == k and comuni / numero < soglia[0]:
+                break
+
+            similarita = comuni / (numero + len(self.ingredienti_di[altra]) - comuni)
+            candidate.append((-similarita, altra))
+            if len(soglia) < k:
+                heapq.heappush(soglia, similarita)
+            elif similarita > soglia[0]:
+                heapq.heapreplace(soglia, similarita)
+
+        return [(altra, -similarita) for similarita, altra in heapq.nsmallest(k, candidate)]
+
+    def abbinamenti(self, ingrediente, k):
+        """
+        Ritorna i k ingredienti che compaiono piu' spesso nelle stesse ricette di
+        quello indicato, come lista di coppie (nome, ricette in comune).
+        """
+        if (ingrediente, k) in self._abbinamenti:
+            return self._abbinamenti[ingrediente, k]
+
+        ricette = self.ricette_di.get(ingrediente)
+        if not ricette:
+            return []
+
+        occorrenze = Counter()
+        for ricetta in ricette:
+            occorrenze.update(self.ingredienti_di[ricetta])
+        del occorrenze[ingrediente]
+
+        conteggi = ((-comuni, altro) for altro, comuni in occorrenze.items())
+
+        risultato = [(altro, -comuni) for comuni, altro in heapq.nsmallest(k, conteggi)]
+        self._abbinamenti[ingrediente, k] = risultato
+        return risultato
+
+
+class IndiceNonPronto(Exception):
+    """
+    L'indice del processo e' ancora in costruzione.
+    """
+
+
+_indice = None
+_costruzione = None
+_lucchetto = threading.Lock()
+
+
+def _costruisci():
+    cursore = cursore_sicuro()
+    coppie = Ricetta.ingredienti.through.objects.values_list('ricetta_id', 'ingrediente_id').iterator()
+
+    return IndiceSimilarita(coppie, cursore)
+
+
+def _aggiorna(indice):
+    """
+    Applica all'indice le modifiche registrate nel feed dopo il suo cursore.
+    Ogni processo mantiene il proprio indice: il feed lo tiene allineato con le
+    scritture fatte da qualunque processo.
+    """
+    massimo = cursore_sicuro()
+    if massimo <= indice.cursore:
+        return
+
+    modifiche = (Modifica.objects
+                 .filter(pk__gt=indice.cursore, pk__lte=massimo)
+                 .filter(Q(modello='ricetta', campo='ingredienti')
+                         | Q(modello__in=['ricetta', 'ingrediente'], operazione=Modifica.ELIMINATO))
+                 .order_by('pk')
+                 .values_list('modello', 'chiave', 'operazione', 'collegato'))
+
+    for modello, chiave, operazione, collegato in modifiche:
+        if operazione == Modifica.COLLEGATO:
+            indice.collega(chiave, collegato)
+        elif operazione == Modifica.SCOLLEGATO:
+            indice.scollega(chiave, collegato)
+        elif modello == 'ricetta':
+            indice.elimina_ricetta(chiave)
+        else:
+            indice.elimina_ingrediente(chiave)
+
+    indice.cursore = massimo
+
+
+def _costruisci_in_background():
+    global _indice, _costruzione
+
+    try:
+        nuovo = _costruisci()
+    except Exception:
+        nuovo = None
+    finally:
+        connections.close_all()
+
+    with _lucchetto:
+        if nuovo is not None and _indice is None:
+            _indice = nuovo
+        _costruzione = None
+
+
+def _indice_aggiornato():
+    """
+    Ritorna l'indice del processo aggiornato in modo incrementale. Va chiamata
+    tenendo _lucchetto, che resta acquisito anche durante l'interrogazione: gli
+    aggiornamenti di un'altra richiesta modificherebbero gli insiemi che
+    l'interrogazione sta scorrendo.
+
+    Se l'indice non c'e' ancora ne avvia la costruzione in un thread separato e
+    solleva IndiceNonPronto, invece di scorrere la tabella dei collegamenti
+    tenendo il lucchetto.
+    """
+    global _costruzione
+
+    if _indice is None:
+        if _costruzione is None:
+            _costruzione = threading.Thread(target=_costruisci_in_background, daemon=True)
+            _costruzione.start()
+        raise IndiceNonPronto()
+
+    _aggiorna(_indice)
+    return _indice
+
+
+def ricette_simili(ricetta, k):
+    """
+    Ritorna le k ricette piu' simili a quella indicata secondo l'indice del processo.
+    """
+    with _lucchetto:
+        return _indice_aggiornato().simili(ricetta, k)
+
+
+def ingredienti_abbinati(ingrediente, k):
+    """
+    Ritorna i k ingredienti abbinati piu' spesso a quello indicato secondo
+    l'indice del processo.
+    """
+    with _lucchetto:
+        return _indice_aggiornato().abbinamenti(ingrediente, k)
+
+
+def prepara_indice():
+    """
+    Costruisce subito l'indice del processo, se non c'e' ancora, come
+    prepara_classifiche() per le classifiche.
+    """
+    global _indice
+
+    nuovo = _costruisci()
+    with _lucchetto:
+        if _indice is None:
+            _indice = nuovo
+
+
+def azzera_indice():
+    """
+    Scarta l'indice del processo, che verra' ricostruito alla prossima richiesta.
+    """
+    global _indice
+
+    with _lucchetto:
+        _indice = None
@@ -0,0 +1,35 @@
+from django.db import connections, router
+
+
+def stima_righe(modello):
+    """
+    Ritorna una stima del numero di righe della tabella del modello letta dalle
+    statistiche del database, senza scorrere la tabella. Ritorna None se il
+    database non offre una stima.
+
+    La stima puo' essere imprecisa: su SQLite e' il rowid massimo, che non tiene
+    conto delle righe eliminate, su PostgreSQL e MySQL e' aggiornata da ANALYZE.
+    """
+    alias = router.db_for_read(modello)
+    connessione = connections[alias]
+    tabella = modello._meta.db_table
+
+    if connessione.vendor == 'postgresql':
+        sql = 'SELECT reltuples FROM pg_class WHERE relname = %s'
+        parametri = [tabella]
+    elif connessione.vendor == 'mysql':
+        sql = 'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s'
+        parametri = [tabella]
+    elif connessione.vendor == 'sqlite':
+        sql = f'SELECT MAX(rowid) FROM {connessione.ops.quote_name(tabella)}'
+        parametri = []
+    else:
+        return None
+
+    with connessione.cursor() as cursore:
+        cursore.execute(sql, parametri)
+        riga = cursore.fetchone()
+
+    if riga is None or riga[0] is None or riga[0] < 0:
+        return None
+    return int(riga[0])
@@ -0,0 +1,158 @@
+import sys
+from unittest import skipUnless
+
+from django.apps import apps
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..management.commands.spiega_query import SCANSIONI_COMPLETE
+from ..models import Ristorante, Ricetta, Ingrediente
+
+# Numero massimo di query per pagina, indipendente dalla dimensione del catalogo
+MASSIMO_QUERY = 10
+
+
+@skipUnless(apps.is_installed('django.contrib.admin'), "L'admin non e' installato in questo profilo")
+class AdminTestCase(TestCase):
+
+    @staticmethod
+    def print_results(test_case_name, response, queries):
+        print('\n' + '*' * 50)
+        print(test_case_name)
+        print("Status:", response.status_code)
+        print("Queries:", len(queries))
+        print('*' * 50)
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Configura il database di test con un catalogo abbastanza grande da rendere
+        visibili le query ripetute per riga o per opzione dei widget.
+
+        Ingredienti creati: 60. Ricette create: 60 (3 ingredienti ciascuna).
+        Ristoranti creati: 20 (5 ricette ciascuno).
+        """
+        ingredienti = Ingrediente.objects.bulk_create(
+            [Ingrediente(nome=f'Ingrediente {i:03}', produttore='Produttore Locale') for i in range(60)])
+        ricette = Ricetta.objects.bulk_create([Ricetta(nome=f'Ricetta {i:03}') for i in range(60)])
+        ristoranti = Ristorante.objects.bulk_create(
+            [Ristorante(nome=f'Ristorante {i:03}', indirizzo=f'Via Roma {i}') for i in range(20)])
+
+        Ricetta.ingredienti.through.objects.bulk_create([
+            Ricetta.ingredienti.through(ricetta=ricetta, ingrediente=ingredienti[(i + j) % 60])
+            for i, ricetta in enumerate(ricette) for j in range(3)])
+        Ristorante.ricette.through.objects.bulk_create([
+            Ristorante.ricette.through(ristorante=ristorante, ricetta=ricette[(i * 5 + j) % 60])
+            for i, ristorante in enumerate(ristoranti) for j in range(5)])
+
+        cls.utente = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.utente)
+
+    def get_con_query(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, queries.captured_queries
+
+    def test_changelist_query_limitate(self):
+        """
+        Testa che le liste di ristoranti, ricette e ingredienti, con i conteggi dei
+        collegamenti, vengano mostrate con un numero di query limitato.
+        """
+        for modello in ('ristorante', 'ricetta', 'ingrediente'):
+            # Call
+            response, queries = self.get_con_query(reverse(f'admin:restaurant_manager_{modello}_changelist'))
+
+            # Check
+            self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response, queries=queries)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(queries), MASSIMO_QUERY)
+
+    def test_changelist_ricerca_query_limitate(self):
+        """
+        Testa che la ricerca per prefisso del nome mostri i risultati corretti con un
+        numero di query limitato.
+        """
+        # Call
+        url = reverse('admin:restaurant_manager_ricetta_changelist') + '?q="Ricetta 00"'
+        response, queries = self.get_con_query(url)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response, queries=queries)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 10)
+        self.assertLessEqual(len(queries), MASSIMO_QUERY)
+
+    def test_ricerca_usa_gli_indici(self):
+        """
+        Testa che le ricerche dell'admin, su ogni campo di ricerca, leggano solo
+        le righe con il prefisso cercato tramite un indice invece di scansionare
+        la tabella.
+        """
+        scansione = SCANSIONI_COMPLETE.get(connection.vendor)
+        if scansione is None:
+            self.skipTest(f'Piani di "{connection.vendor}" non riconosciuti')
+
+        richiesta = RequestFactory().get('/')
+        richiesta.user = self.utente
+        for modello in (Ristorante, Ricetta, Ingrediente):
+            # Call
+            queryset, _ = admin.site._registry[modello].get_search_results(
+                richiesta, modello.objects.all(), 'Via Roma')
+            piano = queryset.explain()
+
+            # Check
+            tabelle = {corrispondenza.group(1) for corrispondenza in scansione.finditer(piano)}
+            self.assertNotIn(modello._meta.db_table, tabelle, piano)
+
+    def test_ricerca_per_prefisso(self):
+        """
+        Testa che il lookup 'prefisso' distingua maiuscole e minuscole e confronti
+        letteralmente i caratteri speciali di LIKE e GLOB.
+        """
+        # Setup
+        Ricetta.objects.create(nome='Ricetta [speciale]*')
+
+        # Check
+        self.assertEqual(Ricetta.objects.filter(nome__prefisso='Ricetta 00').count(), 10)
+        self.assertEqual(Ricetta.objects.filter(nome__prefisso='ricetta 00').count(), 0)
+        self.assertEqual(list(Ricetta.objects.filter(nome__prefisso='Ricetta [s').values_list('pk', flat=True)),
+                         ['Ricetta [speciale]*'])
+        self.assertEqual(Ricetta.objects.filter(nome__prefisso='Ricetta ?').count(), 0)
+        self.assertEqual(Ricetta.objects.filter(nome__prefisso='Ricetta %').count(), 0)
+        self.assertEqual(Ricetta.objects.filter(nome__prefisso='Ricetta _').count(), 0)
+
+    def test_change_form_non_elenca_tutte_le_opzioni(self):
+        """
+        Testa che il form di modifica di una ricetta usi l'autocompletamento: solo gli
+        ingredienti collegati vengono mostrati, non l'intera tabella.
+        """
+        # Call
+        url = reverse('admin:restaurant_manager_ricetta_change', args=['Ricetta 000'])
+        response, queries = self.get_con_query(url)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response, queries=queries)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Ingrediente 001')
+        self.assertNotContains(response, 'Ingrediente 030')
+        self.assertLessEqual(len(queries), MASSIMO_QUERY)
+
+    def test_paginator_conteggio_limitato(self):
+        """
+        Testa che con dei filtri il paginator conti al massimo LIMITE righe.
+        """
+        # Importato qui: il modulo admin non e' importabile nei profili senza admin
+        from ..admin import StimaPaginator
+
+        # Call
+        paginator = StimaPaginator(Ingrediente.objects.filter(produttore='Produttore Locale').order_by('pk'), 10)
+        paginator.LIMITE = 25
+
+        # Check
+        self.assertEqual(paginator.count, 25)
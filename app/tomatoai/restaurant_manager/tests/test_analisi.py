@@ -0,0 +1,169 @@
+import sys
+from unittest import mock
+
+from django.urls import reverse
+
+from rest_framework.status import HTTP_200_OK, HTTP_503_SERVICE_UNAVAILABLE
+from rest_framework.test import APITestCase
+
+from .. import analisi
+from ..analisi import Classifica, _costruisci, azzera_analisi, classifiche, prepara_classifiche
+from ..models import Ristorante, Ricetta, Ingrediente
+
+class AnalisiTestCase(APITestCase):
+
+    @staticmethod
+    def print_results(test_case_name, response):
+        print('\n' + '*' * 50)
+        print(test_case_name)
+        print("Status:", response.status_code)
+        print("Data:", response.data)
+        print('*' * 50)
+
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Configura il database di test con un piccolo catalogo.
+
+        Ingredienti creati: Pomodoro, Mozzarella (Produttore Locale), Basilico (Orto Ligure),
+                            Tonno (Mare Nostro).
+        Ricette create: Pizza Margherita (Pomodoro, Mozzarella, Basilico),
+                        Insalata Caprese (Pomodoro, Mozzarella),
+                        Insalata di Tonno (Tonno).
+        Ristoranti creati: Da Mario (Pizza Margherita, Insalata Caprese),
+                        La Pergola (Insalata Caprese),
+                        Il Porto (Insalata di Tonno).
+        """
+        # Creazione ingredienti
+        Ingrediente.objects.create(nome='Pomodoro', produttore='Produttore Locale')
+        Ingrediente.objects.create(nome='Mozzarella', produttore='Produttore Locale')
+        Ingrediente.objects.create(nome='Basilico', produttore='Orto Ligure')
+        Ingrediente.objects.create(nome='Tonno', produttore='Mare Nostro')
+
+        # Creazione ricette
+        Ricetta.objects.create(nome='Pizza Margherita').ingredienti.add('Pomodoro', 'Mozzarella', 'Basilico')
+        Ricetta.objects.create(nome='Insalata Caprese').ingredienti.add('Pomodoro', 'Mozzarella')
+        Ricetta.objects.create(nome='Insalata di Tonno').ingredienti.add('Tonno')
+
+        # Creazione ristoranti
+        Ristorante.objects.create(nome='Da Mario', indirizzo='Via Roma 1').ricette.add('Pizza Margherita',
+                                                                                      'Insalata Caprese')
+        Ristorante.objects.create(nome='La Pergola', indirizzo='Via Milano 2').ricette.add('Insalata Caprese')
+        Ristorante.objects.create(nome='Il Porto', indirizzo='Via del Mare 3').ricette.add('Insalata di Tonno')
+
+    def setUp(self):
+        # Le classifiche sono per processo: vanno ricostruite sui dati di ciascun test.
+        # La costruzione avviene qui e non nel thread separato, che non vedrebbe i
+        # dati della transazione del test
+        azzera_analisi()
+        prepara_classifiche()
+
+    def test_classifiche(self):
+        """
+        Testa che l'endpoint 'analisi-list' conti ogni ristorante una sola volta per
+        ingrediente e per produttore, anche se l'ingrediente compare in piu' ricette.
+        """
+        # Call
+        response = self.client.get(reverse('analisi-list'))
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data['ingredienti'], [
+            {'nome': 'Mozzarella', 'ristoranti': 2},
+            {'nome': 'Pomodoro', 'ristoranti': 2},
+            {'nome': 'Basilico', 'ristoranti': 1},
+            {'nome': 'Tonno', 'ristoranti': 1},
+        ])
+        self.assertEqual(response.data['produttori'], [
+            {'produttore': 'Produttore Locale', 'ristoranti': 2},
+            {'produttore': 'Mare Nostro', 'ristoranti': 1},
+            {'produttore': 'Orto Ligure', 'ristoranti': 1},
+        ])
+        self.assertEqual(response.data['ristoranti'], [
+            {'nome': 'Da Mario', 'ricette': 2},
+            {'nome': 'Il Porto', 'ricette': 1},
+            {'nome': 'La Pergola', 'ricette': 1},
+        ])
+
+    def test_parametro_k(self):
+        """
+        Testa che ?k= limiti la lunghezza di ciascuna classifica.
+        """
+        # Call
+        response = self.client.get(reverse('analisi-list') + '?k=1')
+
+        # Check
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data['ingredienti'], [{'nome': 'Mozzarella', 'ristoranti': 2}])
+        self.assertEqual(response.data['produttori'], [{'produttore': 'Produttore Locale', 'ristoranti': 2}])
+        self.assertEqual(response.data['ristoranti'], [{'nome': 'Da Mario', 'ricette': 2}])
+
+    def test_aggiornamenti_come_ricalcolo(self):
+        """
+        Testa che, dopo collegamenti, scollegamenti, eliminazioni e cambi di
+        produttore, le classifiche incrementali coincidano con un ricalcolo completo.
+        """
+        # Setup
+        classifiche(50)
+
+        Ristorante.objects.get(nome='Il Porto').ricette.add('Pizza Margherita')
+        Ricetta.objects.get(nome='Insalata Caprese').ingredienti.remove('Mozzarella')
+        Ingrediente.objects.filter(nome='Tonno').update(produttore='Orto Ligure')
+        Ingrediente.objects.get(nome='Tonno').save()
+        Ristorante.objects.get(nome='La Pergola').delete()
+        Ingrediente.objects.get(nome='Basilico').ricette.clear()
+        Ricetta.objects.create(nome='Pizza Marinara').ingredienti.add('Pomodoro')
+        Ristorante.objects.create(nome='Da Gino', indirizzo='Via Po 4').ricette.add('Pizza Marinara')
+
+        # Call
+        cursore, ingredienti, produttori, ristoranti = classifiche(50)
+
+        # Check
+        esatta = _costruisci()
+        self.assertEqual(cursore, esatta.cursore)
+        self.assertEqual(ingredienti, esatta.ingredienti.prime(50))
+        self.assertEqual(produttori, esatta.produttori.prime(50))
+        self.assertEqual(ristoranti, esatta.menu.prime(50))
+        self.assertEqual(ingredienti, [('Pomodoro', 3), ('Mozzarella', 2), ('Tonno', 1)])
+        self.assertEqual(produttori, [('Produttore Locale', 3), ('Orto Ligure', 1)])
+
+    def test_classifiche_in_costruzione(self):
+        """
+        Testa che, finche' le classifiche non sono costruite, l'endpoint risponda
+        503 con Retry-After e avvii la costruzione una sola volta, senza eseguirla
+        durante la richiesta.
+        """
+        # Setup
+        azzera_analisi()
+
+        # Call
+        with mock.patch.object(analisi, '_ricalcola') as ricalcola:
+            response = self.client.get(reverse('analisi-list'))
+            seconda = self.client.get(reverse('analisi-list'))
+            analisi._ricalcolo.join()
+        analisi._ricalcolo = None
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertEqual(seconda.status_code, HTTP_503_SERVICE_UNAVAILABLE)
+        ricalcola.assert_called_once_with()
+
+    def test_classifica_a_parita(self):
+        """
+        Testa che le chiavi con lo stesso conteggio siano ordinate per nome e che
+        quelle tornate a zero escano dalla classifica.
+        """
+        # Setup
+        classifica = Classifica()
+        for chiave, volte in (('b', 2), ('a', 2), ('c', 3), ('d', 1)):
+            for _ in range(volte):
+                classifica.varia(chiave, 1)
+        classifica.varia('d', -1)
+
+        # Check
+        self.assertEqual(classifica.prime(3), [('c', 3), ('a', 2), ('b', 2)])
+        self.assertEqual(classifica.prime(10), [('c', 3), ('a', 2), ('b', 2)])
@@ -114,6 +114,25 @@ class IngredienteTestCase(APITestCase):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]['nome'], 'Pomodoro')
 
+    def test_filter_by_produttore(self):
+        """
+        Testa il filtro degli ingredienti per produttore tramite l'endpoint 'ingrediente-list'.
+        Dopo aver creato 'Basilico' con un produttore diverso, verifica che filtrando per
+        'Orto Ligure' la risposta sia HTTP 200 OK e contenga solo 'Basilico'.
+        """
+        # Setup
+        Ingrediente.objects.create(nome='Basilico', produttore='Orto Ligure')
+
+        # Call
+        url = reverse('ingrediente-list') + '?produttore=Orto Ligure'
+        response = self.client.get(url)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['nome'], 'Basilico')
+
     def test_create_ingrediente(self):
         """
         Testa la creazione di un nuovo ingrediente tramite POST all'endpoint 'ingrediente-list'.
@@ -0,0 +1,246 @@
+import os
+import sys
+import tempfile
+from itertools import combinations
+from unittest import mock
+
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.status import HTTP_200_OK
+from rest_framework.test import APITestCase
+
+from ..istantanee import azzera_istantanea, pubblica_istantanea
+from ..lavori import accoda, esegui_lavoro
+from ..models import Ristorante, Ricetta, Ingrediente, Lavoro
+from ..views import RistoranteViewSet, RicettaViewSet, IngredienteViewSet
+
+class IstantaneaTestCase(APITestCase):
+
+    @staticmethod
+    def print_results(test_case_name, response):
+        print('\n' + '*' * 50)
+        print(test_case_name)
+        print("Status:", response.status_code)
+        print("Data:", response.data)
+        print('*' * 50)
+
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Configura il database di test con un piccolo catalogo.
+
+        Ingredienti creati: Pomodoro, Mozzarella (Produttore Locale), Basilico (Orto Ligure).
+        Ricette create: Pizza Margherita (Pomodoro, Mozzarella, Basilico),
+                        Insalata Caprese (Pomodoro, Mozzarella).
+        Ristoranti creati: Da Mario (Pizza Margherita),
+                        La Pergola (Insalata Caprese, Pizza Margherita).
+        """
+        # Creazione ingredienti
+        Ingrediente.objects.create(nome='Pomodoro', produttore='Produttore Locale')
+        Ingrediente.objects.create(nome='Mozzarella', produttore='Produttore Locale')
+        Ingrediente.objects.create(nome='Basilico', produttore='Orto Ligure')
+
+        # Creazione ricette
+        Ricetta.objects.create(nome='Pizza Margherita').ingredienti.add('Pomodoro', 'Mozzarella', 'Basilico')
+        Ricetta.objects.create(nome='Insalata Caprese').ingredienti.add('Pomodoro', 'Mozzarella')
+
+        # Creazione ristoranti
+        Ristorante.objects.create(nome='Da Mario', indirizzo='Via Roma 1').ricette.add('Pizza Margherita')
+        Ristorante.objects.create(nome='La Pergola', indirizzo='Via Milano 2').ricette.add('Insalata Caprese',
+                                                                                          'Pizza Margherita')
+
+    def setUp(self):
+        # L'istantanea e' per processo e il file e' diverso per ogni test
+        cartella = tempfile.TemporaryDirectory()
+        self.addCleanup(cartella.cleanup)
+        self.percorso = os.path.join(cartella.name, 'catalogo.bin')
+
+        impostazioni = override_settings(RESTAURANT_MANAGER_ISTANTANEA=self.percorso)
+        impostazioni.enable()
+        self.addCleanup(impostazioni.disable)
+
+        azzera_istantanea()
+        self.addCleanup(azzera_istantanea)
+
+    def test_lista_senza_database(self):
+        """
+        Testa che, dopo la pubblicazione, la lista dei ristoranti venga servita
+        dall'istantanea senza query, nella stessa forma del serializer.
+        """
+        # Setup
+        versione = pubblica_istantanea().versione
+
+        # Call
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('ristorante-list'))
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response['X-Catalog-Snapshot'], str(versione))
+        self.assertEqual(response.data, [
+            {'nome': 'Da Mario', 'indirizzo': 'Via Roma 1', 'ricette': ['Pizza Margherita']},
+            {'nome': 'La Pergola', 'indirizzo': 'Via Milano 2', 'ricette': ['Insalata Caprese', 'Pizza Margherita']},
+        ])
+
+    def test_filtri_come_database(self):
+        """
+        Testa che ogni combinazione di filtri delle viste dia sull'istantanea gli
+        stessi oggetti del database, nello stesso ordine e senza ripetizioni, anche
+        con valori inesistenti.
+        """
+        # Setup
+        istantanea = pubblica_istantanea()
+        valori = ['Da Mario', 'La Pergola', 'Via Roma 1', 'Pizza Margherita', 'Insalata Caprese',
+                  'Pomodoro', 'Basilico', 'Orto Ligure', 'Produttore Locale', 'Inesistente']
+
+        for viewset in (RistoranteViewSet, RicettaViewSet, IngredienteViewSet):
+            modello = viewset.queryset.model._meta.model_name
+            for numero in (1, 2):
+                for parametri in combinations(viewset.filtri, numero):
+                    for valore in valori:
+                        query = {parametro: valore for parametro in parametri}
+                        if numero == 2:
+                            query[parametri[0]] = valori[valori.index(valore) - 1]
+
+                        # Check
+                        attesi = list(viewset.filtra(viewset.queryset.all(), query).values_list('pk', flat=True))
+                        ottenuti = [oggetto['nome'] for oggetto in istantanea.elenco(modello, viewset.filtri, query)]
+                        self.assertEqual(ottenuti, attesi, f'{viewset.__name__} {query}')
+
+    def test_lista_paginata_come_database(self):
+        """
+        Testa che, con la paginazione, le pagine servite dall'istantanea coincidano
+        con quelle servite dal database, anche con filtri che attraversano le relazioni.
+        """
+        # Setup
+        class Paginazione(PageNumberPagination):
+            page_size = 1
+
+        url = reverse('ingrediente-list') + '?nome_ristorante=La Pergola'
+        pagine = {}
+
+        with mock.patch.object(IngredienteViewSet, 'pagination_class', Paginazione):
+            for fonte in ('database', 'istantanea'):
+                if fonte == 'istantanea':
+                    pubblica_istantanea()
+
+                # Call
+                pagine[fonte] = [self.client.get(url, {'page': pagina}) for pagina in (1, 2, 3)]
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=pagine['istantanea'][1])
+        self.assertNotIn('X-Catalog-Snapshot', pagine['database'][0])
+        self.assertIn('X-Catalog-Snapshot', pagine['istantanea'][0])
+        for database, istantanea in zip(pagine['database'], pagine['istantanea']):
+            self.assertEqual(istantanea.status_code, HTTP_200_OK)
+            self.assertEqual(istantanea.data['count'], 3)
+            self.assertEqual(istantanea.data['results'], database.data['results'])
+        self.assertEqual([pagina.data['results'][0]['nome'] for pagina in pagine['istantanea']],
+                         ['Basilico', 'Mozzarella', 'Pomodoro'])
+
+    def test_versione_e_cursore_sicuro(self):
+        """
+        Testa che la versione dell'istantanea, da cui i client leggono le modifiche
+        successive, non superi il cursore sicuro del feed.
+        """
+        # Call
+        with override_settings(RESTAURANT_MANAGER_MODIFICHE_RITARDO=60):
+            versione = pubblica_istantanea().versione
+
+        # Check
+        self.assertEqual(versione, 0)
+        self.assertGreater(pubblica_istantanea().versione, 0)
+
+    def test_collegamenti_senza_estremi_scartati(self):
+        """
+        Testa che la compilazione non fallisca con collegamenti verso oggetti non
+        letti, come quelli creati da una transazione concorrente, e li scarti.
+        """
+        # Setup: il vincolo di chiave esterna e' differito alla conferma, che nel test non avviene
+        fantasma, = Ricetta.ingredienti.through.objects.bulk_create([
+            Ricetta.ingredienti.through(ricetta_id='Pizza Fantasma', ingrediente_id='Pomodoro')])
+        self.addCleanup(Ricetta.ingredienti.through.objects.filter(pk=fantasma.pk).delete)
+
+        # Call
+        istantanea = pubblica_istantanea()
+
+        # Check
+        filtro = {'nome_ingrediente': 'Pomodoro'}
+        self.assertEqual(istantanea.elenco('ingrediente', IngredienteViewSet.filtri, filtro),
+                         [{'nome': 'Pomodoro', 'produttore': 'Produttore Locale'}])
+        filtro = {'nome_ricetta': 'Pizza Fantasma'}
+        self.assertEqual(istantanea.elenco('ingrediente', IngredienteViewSet.filtri, filtro), [])
+
+    def test_nuova_versione_sostituisce_la_precedente(self):
+        """
+        Testa che una nuova pubblicazione venga vista dalla richiesta successiva e che,
+        fino ad allora, le modifiche al database non compaiano nella lista.
+        """
+        # Setup
+        precedente = pubblica_istantanea().versione
+        Ingrediente.objects.create(nome='Origano', produttore='Orto Ligure')
+        url = reverse('ingrediente-list') + '?produttore=Orto Ligure'
+
+        # Call
+        response = self.client.get(url)
+
+        # Check
+        self.assertEqual([ingrediente['nome'] for ingrediente in response.data], ['Basilico'])
+
+        # Call
+        pubblica_istantanea()
+        response = self.client.get(url)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual([ingrediente['nome'] for ingrediente in response.data], ['Basilico', 'Origano'])
+        self.assertGreater(int(response['X-Catalog-Snapshot']), precedente)
+
+    def test_senza_istantanea_usa_il_database(self):
+        """
+        Testa che, se l'istantanea non e' ancora pubblicata o non e' leggibile, la
+        lista venga servita dal database.
+        """
+        # Call
+        response = self.client.get(reverse('ricetta-list'))
+
+        # Check
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertNotIn('X-Catalog-Snapshot', response)
+        self.assertEqual(len(response.data), 2)
+
+        # Setup
+        with open(self.percorso, 'wb') as file:
+            file.write(b'non e\' un\'istantanea')
+
+        # Call
+        response = self.client.get(reverse('ricetta-list'))
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertNotIn('X-Catalog-Snapshot', response)
+        self.assertEqual(len(response.data), 2)
+
+    def test_lavoro_pubblica_catalogo(self):
+        """
+        Testa che il lavoro 'pubblica_catalogo' pubblichi l'istantanea e ne riporti
+        la versione e il numero di oggetti.
+        """
+        # Setup
+        lavoro = accoda('pubblica_catalogo')
+
+        # Call
+        stato = esegui_lavoro(lavoro.pk)
+
+        # Check
+        lavoro.refresh_from_db()
+        self.assertEqual(stato, Lavoro.COMPLETATO)
+        self.assertTrue(os.path.exists(self.percorso))
+        self.assertEqual(lavoro.risultato['ristorante'], 2)
+        self.assertEqual(lavoro.risultato['ricetta'], 2)
+        self.assertEqual(lavoro.risultato['ingrediente'], 3)
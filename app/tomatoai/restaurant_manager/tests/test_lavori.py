@@ -0,0 +1,184 @@
+import sys
+import json
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.urls import reverse
+
+from rest_framework.status import HTTP_200_OK, HTTP_202_ACCEPTED, HTTP_400_BAD_REQUEST
+from rest_framework.test import APITestCase
+
+from ..lavori import ParametriNonValidi, accoda, esegui_lavoro, preleva_lavori, recupera_lavori_scaduti
+from ..models import Ristorante, Ricetta, Ingrediente, Lavoro
+
+CATALOGO = {
+    'ingredienti': [{'nome': 'Pomodoro', 'produttore': 'Produttore Locale'},
+                    {'nome': 'Mozzarella', 'produttore': 'Caseificio'}],
+    'ricette': [{'nome': 'Pizza Margherita', 'ingredienti': ['Pomodoro', 'Mozzarella']}],
+    'ristoranti': [{'nome': 'Da Mario', 'indirizzo': 'Via Roma 1', 'ricette': ['Pizza Margherita']}],
+}
+
+class LavoroTestCase(APITestCase):
+
+    @staticmethod
+    def print_results(test_case_name, response):
+        print('\n' + '*' * 50)
+        print(test_case_name)
+        print("Status:", response.status_code)
+        print("Data:", response.data)
+        print('*' * 50)
+
+    def test_accoda_importazione(self):
+        """
+        Testa che un POST all'endpoint 'lavoro-list' accodi un lavoro di importazione
+        senza eseguirlo: la risposta deve essere HTTP 202 Accepted con l'ID del lavoro
+        e lo stato 'in_coda', e il catalogo non deve ancora essere stato importato.
+        """
+        # Call
+        url = reverse('lavoro-list')
+        data = {'tipo': 'importa_catalogo', 'parametri': CATALOGO}
+        response = self.client.post(url, json.dumps(data), content_type='application/json')
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['stato'], Lavoro.IN_CODA)
+        self.assertTrue(Lavoro.objects.filter(pk=response.data['id']).exists())
+        self.assertEqual(Ingrediente.objects.count(), 0)
+
+    def test_accoda_tipo_sconosciuto(self):
+        """
+        Testa che un tipo di lavoro non registrato venga rifiutato con HTTP 400 Bad Request.
+        """
+        # Call
+        url = reverse('lavoro-list')
+        data = {'tipo': 'formatta_disco'}
+        response = self.client.post(url, json.dumps(data), content_type='application/json')
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        self.assertEqual(Lavoro.objects.count(), 0)
+
+    def test_accoda_parametri_non_validi(self):
+        """
+        Testa che un'importazione con un catalogo malformato venga rifiutata con
+        HTTP 400 Bad Request invece di essere accodata.
+        """
+        # Call
+        url = reverse('lavoro-list')
+        data = {'tipo': 'importa_catalogo',
+                'parametri': {'ingredienti': [{'nome': 'Pomodoro'}]}}
+        response = self.client.post(url, json.dumps(data), content_type='application/json')
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        self.assertIn('parametri', response.data)
+        self.assertEqual(Lavoro.objects.count(), 0)
+        with self.assertRaises(ParametriNonValidi):
+            accoda('importa_catalogo', {'ricette': 'Pizza Margherita'})
+
+    def test_worker_esegue_importazione(self):
+        """
+        Testa che il comando 'esegui_lavori' esegua l'importazione accodata e che
+        l'endpoint 'lavoro-detail' riporti il lavoro come completato al 100%, con
+        ricette, ingredienti e ristoranti presenti nel database.
+        """
+        # Prepara il lavoro
+        lavoro = accoda('importa_catalogo', CATALOGO)
+
+        # Call
+        call_command('esegui_lavori', processi=0, una_volta=True, stdout=sys.stdout)
+        url = reverse('lavoro-detail', kwargs={'pk': lavoro.pk})
+        response = self.client.get(url)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data['stato'], Lavoro.COMPLETATO)
+        self.assertEqual(response.data['progresso'], 100)
+        self.assertEqual(Ricetta.objects.get(pk='Pizza Margherita').ingredienti.count(), 2)
+        self.assertEqual(list(Ristorante.objects.get(pk='Da Mario').ricette.values_list('pk', flat=True)),
+                         ['Pizza Margherita'])
+
+    def test_lavoro_fallito_viene_ritentato(self):
+        """
+        Testa che un lavoro che fallisce venga rimesso in coda finche' ha tentativi
+        disponibili e marcato come fallito all'ultimo tentativo.
+        """
+        # Prepara il lavoro: la ricetta fa riferimento a un ingrediente inesistente
+        lavoro = accoda('importa_catalogo', {'ricette': [{'nome': 'Pizza', 'ingredienti': ['Inesistente']}]},
+                        max_tentativi=2)
+
+        # Primo tentativo
+        self.assertEqual(preleva_lavori(1), [lavoro.pk])
+        self.assertEqual(esegui_lavoro(lavoro.pk), Lavoro.IN_CODA)
+
+        # Secondo tentativo, senza attendere il ritardo
+        Lavoro.objects.filter(pk=lavoro.pk).update(disponibile_da=lavoro.creato)
+        self.assertEqual(preleva_lavori(1), [lavoro.pk])
+        self.assertEqual(esegui_lavoro(lavoro.pk), Lavoro.FALLITO)
+
+        lavoro.refresh_from_db()
+        self.assertEqual(lavoro.tentativi, 2)
+        self.assertNotEqual(lavoro.messaggio, '')
+
+    def test_parametri_non_validi_non_ritentati(self):
+        """
+        Testa che un lavoro con parametri non validi, accodato senza passare dalla
+        validazione, venga marcato come fallito al primo tentativo.
+        """
+        # Prepara il lavoro
+        lavoro = Lavoro.objects.create(tipo='importa_catalogo',
+                                       parametri={'ristoranti': [{'nome': 'Da Mario'}]},
+                                       max_tentativi=3)
+
+        # Call
+        self.assertEqual(preleva_lavori(1), [lavoro.pk])
+        stato = esegui_lavoro(lavoro.pk)
+
+        # Check
+        self.assertEqual(stato, Lavoro.FALLITO)
+        lavoro.refresh_from_db()
+        self.assertEqual(lavoro.tentativi, 1)
+        self.assertIn('indirizzo', lavoro.messaggio)
+        self.assertEqual(Ristorante.objects.count(), 0)
+
+    def test_recupero_lavori_scaduti(self):
+        """
+        Testa che i lavori rimasti in esecuzione oltre la scadenza tornino in coda se
+        hanno tentativi disponibili e vengano marcati come falliti altrimenti, cosi'
+        un lavoro che termina ogni volta il worker non viene ritentato all'infinito.
+        """
+        # Prepara i lavori, entrambi prelevati da un worker poi terminato
+        ritentabile = accoda('importa_catalogo', CATALOGO, max_tentativi=2)
+        esaurito = accoda('importa_catalogo', CATALOGO, max_tentativi=1)
+        self.assertEqual(sorted(preleva_lavori(2)), sorted([ritentabile.pk, esaurito.pk]))
+
+        # Call
+        self.assertEqual(recupera_lavori_scaduti(timedelta(seconds=60)), (0, 0))
+        self.assertEqual(recupera_lavori_scaduti(timedelta(seconds=-1)), (1, 1))
+
+        # Check
+        ritentabile.refresh_from_db()
+        esaurito.refresh_from_db()
+        self.assertEqual(ritentabile.stato, Lavoro.IN_CODA)
+        self.assertEqual(esaurito.stato, Lavoro.FALLITO)
+        self.assertNotEqual(esaurito.messaggio, '')
+
+    def test_worker_recupera_durante_esecuzione(self):
+        """
+        Testa che il comando 'esegui_lavori' liberi i lavori scaduti nel proprio ciclo
+        e li esegua nello stesso passaggio.
+        """
+        # Prepara un lavoro prelevato da un worker terminato
+        lavoro = accoda('importa_catalogo', CATALOGO)
+        preleva_lavori(1)
+
+        # Call
+        call_command('esegui_lavori', processi=0, una_volta=True, scadenza=-1, stdout=sys.stdout)
+
+        # Check
+        lavoro.refresh_from_db()
+        self.assertEqual(lavoro.stato, Lavoro.COMPLETATO)
@@ -0,0 +1,177 @@
+import sys
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework.status import HTTP_200_OK, HTTP_429_TOO_MANY_REQUESTS
+from rest_framework.test import APITestCase
+
+from ..limiti import azzera_locali
+from ..models import Ricetta, Ingrediente
+
+LIMITI = {
+    'ricette': {'capacita': 10, 'ricarica': 0.5, 'lotto': 4, 'righe_per_token': 1},
+}
+
+@override_settings(RESTAURANT_MANAGER_LIMITI=LIMITI)
+class LimitiTestCase(APITestCase):
+
+    @staticmethod
+    def print_results(test_case_name, response):
+        print('\n' + '*' * 50)
+        print(test_case_name)
+        print("Status:", response.status_code)
+        print("Data:", response.data)
+        print('*' * 50)
+
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Configura il database di test con tre ricette.
+
+        Ingredienti creati: Pomodoro.
+        Ricette create: Pizza Margherita, Pizza Marinara, Insalata Caprese (ingredienti: Pomodoro).
+        """
+        Ingrediente.objects.create(nome='Pomodoro', produttore='Produttore Locale')
+        for nome in ('Pizza Margherita', 'Pizza Marinara', 'Insalata Caprese'):
+            Ricetta.objects.create(nome=nome).ingredienti.add('Pomodoro')
+
+    def setUp(self):
+        # I secchi sono nella cache e i lotti nel processo: ogni test parte dal secchio pieno
+        cache.clear()
+        azzera_locali()
+        self.addCleanup(cache.clear)
+        self.addCleanup(azzera_locali)
+
+    def test_intestazioni_budget(self):
+        """
+        Testa che le risposte riportino capacita', budget rimasto e costo della
+        richiesta, e che il budget diminuisca del costo.
+        """
+        # Call
+        url = reverse('ricetta-detail', kwargs={'pk': 'Pizza Margherita'})
+        prima = self.client.get(url)
+        dopo = self.client.get(url)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=dopo)
+        self.assertEqual(dopo.status_code, HTTP_200_OK)
+        self.assertEqual(dopo['X-RateLimit-Limit'], '10')
+        self.assertEqual(dopo['X-RateLimit-Cost'], '1')
+        self.assertEqual(int(prima['X-RateLimit-Remaining']) - int(dopo['X-RateLimit-Remaining']), 1)
+
+    def test_costo_dipende_da_righe_e_join(self):
+        """
+        Testa che la lista completa costi in proporzione alle righe della tabella, la
+        ricerca per chiave primaria un token e i filtri su relazioni un token per join.
+        """
+        # Call
+        completa = self.client.get(reverse('ricetta-list'))
+        per_nome = self.client.get(reverse('ricetta-list') + '?nome_ricetta=Pizza Marinara')
+        per_ristorante = self.client.get(reverse('ricetta-list') + '?nome_ristorante=Da Mario')
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=completa)
+        self.assertEqual(completa['X-RateLimit-Cost'], '4')
+        self.assertEqual(per_nome['X-RateLimit-Cost'], '2')
+        self.assertEqual(per_ristorante['X-RateLimit-Cost'], '3')
+
+    def test_budget_esaurito(self):
+        """
+        Testa che, esaurito il budget, le richieste vengano rifiutate con 429 e
+        Retry-After, senza influire sugli altri client.
+        """
+        # Setup
+        url = reverse('ricetta-list')
+        for _ in range(2):
+            self.assertEqual(self.client.get(url).status_code, HTTP_200_OK)
+
+        # Call
+        response = self.client.get(url)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '4')
+        self.assertEqual(response['X-RateLimit-Remaining'], '2')
+
+        response = self.client.get(url, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_budget_condiviso_tra_processi(self):
+        """
+        Testa che i token prelevati da un processo restino spesi per gli altri: un
+        nuovo processo (senza lotti locali) trova il secchio condiviso gia' ridotto.
+        """
+        # Setup
+        url = reverse('ricetta-list')
+        self.client.get(url)
+        self.client.get(url)
+
+        # Call
+        azzera_locali()
+        response = self.client.get(url)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_x_forwarded_for_ignorato_senza_proxy(self):
+        """
+        Testa che, con NUM_PROXIES a 0, un client non possa ottenere un nuovo budget
+        cambiando l'intestazione X-Forwarded-For.
+        """
+        # Setup
+        url = reverse('ricetta-list')
+        rest_framework = {**getattr(settings, 'REST_FRAMEWORK', {}), 'NUM_PROXIES': 0}
+
+        # Call
+        with self.settings(REST_FRAMEWORK=rest_framework):
+            risposte = [
+                self.client.get(url, HTTP_X_FORWARDED_FOR=f'10.0.0.{i}')
+                for i in range(3)
+            ]
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=risposte[-1])
+        self.assertEqual(risposte[-1].status_code, HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_secchio_bloccato(self):
+        """
+        Testa che, se il secchio condiviso resta bloccato da un altro processo, la
+        richiesta venga rifiutata con un breve Retry-After invece di aggiornare il
+        secchio senza lucchetto.
+        """
+        # Setup
+        cache.add('limiti:ricette:ip:127.0.0.1:lucchetto', 1)
+
+        # Call
+        response = self.client.get(reverse('ricetta-list'))
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertIsNone(cache.get('limiti:ricette:ip:127.0.0.1'))
+
+        # Call
+        cache.delete('limiti:ricette:ip:127.0.0.1:lucchetto')
+        response = self.client.get(reverse('ricetta-list'))
+
+        # Check
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    @override_settings(RESTAURANT_MANAGER_LIMITI={})
+    def test_scope_senza_limite(self):
+        """
+        Testa che le viste il cui scope non e' configurato non siano limitate.
+        """
+        # Call
+        response = self.client.get(reverse('ricetta-list'))
+
+        # Check
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertNotIn('X-RateLimit-Remaining', response)
@@ -0,0 +1,250 @@
+import sys
+import json
+
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+from rest_framework.test import APITestCase
+
+from ..models import Ristorante, Ricetta, Ingrediente, Modifica
+from ..modifiche import compatta_registro
+
+class ModificaTestCase(APITestCase):
+
+    @staticmethod
+    def print_results(test_case_name, response):
+        print('\n' + '*' * 50)
+        print(test_case_name)
+        print("Status:", response.status_code)
+        print("Data:", response.data)
+        print('*' * 50)
+
+    
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Configura il database di test con dati iniziali e registra il cursore
+        raggiunto dopo la loro creazione.
+
+        Ingredienti creati: Pomodoro, Mozzarella.
+        Ricette create: Pizza Margherita (ingredienti: Pomodoro, Mozzarella).
+        Ristoranti creati: Da Mario (ricette: Pizza Margherita).
+        """
+        # Creazione ingredienti
+        ingrediente1 = Ingrediente.objects.create(nome='Pomodoro', produttore='Produttore Locale')
+        ingrediente2 = Ingrediente.objects.create(nome='Mozzarella', produttore='Produttore Locale')
+
+        # Creazione ricette
+        ricetta = Ricetta.objects.create(nome='Pizza Margherita')
+        ricetta.ingredienti.add(ingrediente1, ingrediente2)
+
+        # Creazione ristoranti
+        Ristorante.objects.create(nome='Da Mario', indirizzo='Via Roma 1').ricette.add(ricetta)
+
+        cls.cursore = Modifica.objects.latest('pk').pk
+
+    def leggi_modifiche(self, cursore, **parametri):
+        url = reverse('modifica-list')
+        return self.client.get(url, {'since': cursore, **parametri})
+
+    def test_feed_completo(self):
+        """
+        Testa che leggendo il feed dall'inizio si ottengano tutti gli oggetti creati,
+        con i loro dati, e tutti i collegamenti, e che il cursore ritornato sia quello
+        dell'ultima modifica.
+        """
+        # Call
+        response = self.leggi_modifiche(0)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data['cursore'], self.cursore)
+        self.assertFalse(response.data['altre'])
+
+        salvati = {(m['modello'], m['chiave']): m['dati'] for m in response.data['modifiche']
+                   if m['operazione'] == Modifica.SALVATO}
+        self.assertEqual(salvati[('ristorante', 'Da Mario')], {'nome': 'Da Mario', 'indirizzo': 'Via Roma 1'})
+        self.assertEqual(len(salvati), 4)
+
+        collegati = {(m['chiave'], m['collegato']) for m in response.data['modifiche']
+                     if m['operazione'] == Modifica.COLLEGATO}
+        self.assertEqual(collegati, {('Pizza Margherita', 'Pomodoro'),
+                                     ('Pizza Margherita', 'Mozzarella'),
+                                     ('Da Mario', 'Pizza Margherita')})
+
+    def test_feed_compatta_per_chiave(self):
+        """
+        Testa che piu' modifiche allo stesso oggetto dopo il cursore vengano compattate
+        nell'ultima: due aggiornamenti di un ingrediente producono una sola modifica
+        con i dati piu' recenti.
+        """
+        # Prepara le modifiche
+        url = reverse('ingrediente-detail', kwargs={'pk': 'Pomodoro'})
+        self.client.patch(url, json.dumps({'produttore': 'Esselunga'}), content_type='application/json')
+        self.client.patch(url, json.dumps({'produttore': 'Coop'}), content_type='application/json')
+
+        # Call
+        response = self.leggi_modifiche(self.cursore)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(len(response.data['modifiche']), 1)
+        self.assertEqual(response.data['modifiche'][0]['dati'], {'nome': 'Pomodoro', 'produttore': 'Coop'})
+
+    def test_feed_collegamenti_ed_eliminazioni(self):
+        """
+        Testa che la rimozione di un ingrediente da una ricetta, anche dal lato inverso,
+        e l'eliminazione di un ristorante compaiano nel feed successivo al cursore.
+        """
+        # Prepara le modifiche
+        Ingrediente.objects.get(pk='Mozzarella').ricette.clear()
+        Ristorante.objects.get(pk='Da Mario').delete()
+
+        # Call
+        response = self.leggi_modifiche(self.cursore)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        modifiche = [(m['operazione'], m['modello'], m['chiave'], m.get('collegato'))
+                     for m in response.data['modifiche']]
+        self.assertEqual(modifiche, [(Modifica.SCOLLEGATO, 'ricetta', 'Pizza Margherita', 'Mozzarella'),
+                                     (Modifica.ELIMINATO, 'ristorante', 'Da Mario', None)])
+
+    def test_feed_eliminazione_e_ricreazione(self):
+        """
+        Testa che un oggetto eliminato e ricreato dopo il cursore venga riportato con
+        l'eliminazione prima del nuovo salvataggio, cosi' che il client rimuova i
+        collegamenti precedenti, eliminati in cascata senza una modifica propria.
+        """
+        # Prepara le modifiche
+        Ingrediente.objects.create(nome='Basilico', produttore='Orto Ligure')
+        Ricetta.objects.create(nome='Pizza Marinara').ingredienti.add('Pomodoro')
+        cursore = Modifica.objects.latest('pk').pk
+        Ricetta.objects.get(pk='Pizza Marinara').delete()
+        Ricetta.objects.create(nome='Pizza Marinara').ingredienti.add('Basilico')
+
+        # Call
+        response = self.leggi_modifiche(cursore)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        modifiche = [(m['operazione'], m['modello'], m['chiave'], m.get('collegato'))
+                     for m in response.data['modifiche']]
+        self.assertEqual(modifiche, [(Modifica.ELIMINATO, 'ricetta', 'Pizza Marinara', None),
+                                     (Modifica.SALVATO, 'ricetta', 'Pizza Marinara', None),
+                                     (Modifica.COLLEGATO, 'ricetta', 'Pizza Marinara', 'Basilico')])
+
+        # Call
+        response = self.leggi_modifiche(0)
+
+        # Check
+        modifiche = [(m['operazione'], m['chiave'], m.get('collegato')) for m in response.data['modifiche']
+                     if m['chiave'] == 'Pizza Marinara']
+        self.assertEqual(modifiche, [(Modifica.COLLEGATO, 'Pizza Marinara', 'Pomodoro'),
+                                     (Modifica.ELIMINATO, 'Pizza Marinara', None),
+                                     (Modifica.SALVATO, 'Pizza Marinara', None),
+                                     (Modifica.COLLEGATO, 'Pizza Marinara', 'Basilico')])
+
+    def test_feed_paginato(self):
+        """
+        Testa che il parametro 'limit' divida il feed in pagine e che seguendo il cursore
+        si leggano tutte le modifiche una sola volta.
+        """
+        # Call
+        chiavi = []
+        cursore = 0
+        while True:
+            response = self.leggi_modifiche(cursore, limit=2)
+            self.assertEqual(response.status_code, HTTP_200_OK)
+            self.assertLessEqual(len(response.data['modifiche']), 2)
+            chiavi += [m['cursore'] for m in response.data['modifiche']]
+            cursore = response.data['cursore']
+            if not response.data['altre']:
+                break
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(len(chiavi), len(set(chiavi)))
+        self.assertEqual(len(chiavi), len(self.leggi_modifiche(0).data['modifiche']))
+
+    def test_feed_pagina_limitata_al_registro(self):
+        """
+        Testa che una pagina compatti solo 'limit' righe del registro dopo il
+        cursore, anche se le successive modificano le stesse chiavi, e che le
+        pagine seguenti riportino l'ultimo stato.
+        """
+        # Prepara le modifiche
+        for produttore in ('Esselunga', 'Coop', 'Conad', 'Despar'):
+            Ingrediente.objects.filter(pk='Pomodoro').update(produttore=produttore)
+            Ingrediente.objects.get(pk='Pomodoro').save()
+
+        # Call
+        response = self.leggi_modifiche(self.cursore, limit=3)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(len(response.data['modifiche']), 1)
+        self.assertEqual(response.data['cursore'], self.cursore + 3)
+        self.assertTrue(response.data['altre'])
+
+        response = self.leggi_modifiche(response.data['cursore'], limit=3)
+        self.assertEqual(response.data['modifiche'][0]['dati'], {'nome': 'Pomodoro', 'produttore': 'Despar'})
+        self.assertEqual(response.data['cursore'], self.cursore + 4)
+        self.assertFalse(response.data['altre'])
+
+    def test_compattazione_registro(self):
+        """
+        Testa che la compattazione elimini le modifiche superate, ma non le
+        eliminazioni, e che il feed letto dall'inizio resti lo stesso.
+        """
+        # Prepara le modifiche
+        Ingrediente.objects.get(pk='Pomodoro').save()
+        Ristorante.objects.get(pk='Da Mario').delete()
+        Ristorante.objects.create(nome='Da Mario', indirizzo='Via Po 4')
+        prima = self.leggi_modifiche(0).data['modifiche']
+
+        # Call
+        eliminate = compatta_registro(conservazione=0)
+
+        # Check
+        dopo = self.leggi_modifiche(0).data['modifiche']
+        self.assertEqual(eliminate, 2)
+        self.assertEqual(dopo, prima)
+        self.assertTrue(Modifica.objects.filter(modello='ristorante', operazione=Modifica.ELIMINATO).exists())
+
+    def test_feed_con_ritardo(self):
+        """
+        Testa che, con RESTAURANT_MANAGER_MODIFICHE_RITARDO, le modifiche piu'
+        recenti del ritardo non vengano esposte e il cursore non le superi.
+        """
+        # Prepara le modifiche
+        Ingrediente.objects.get(pk='Pomodoro').save()
+        Modifica.objects.filter(pk__lte=self.cursore).update(creato='2000-01-01T00:00:00Z')
+
+        # Call
+        with override_settings(RESTAURANT_MANAGER_MODIFICHE_RITARDO=60):
+            response = self.leggi_modifiche(0)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data['cursore'], self.cursore)
+        self.assertFalse(response.data['altre'])
+        self.assertEqual(len(response.data['modifiche']), 7)
+
+    def test_feed_cursore_non_valido(self):
+        """
+        Testa che un cursore non numerico venga rifiutato con HTTP 400 Bad Request.
+        """
+        # Call
+        response = self.leggi_modifiche('ieri')
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
@@ -1,9 +1,10 @@
 import sys
 import json
 
+from django.db.models.signals import m2m_changed
 from django.urls import reverse
 
-from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_204_NO_CONTENT, HTTP_404_NOT_FOUND
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_204_NO_CONTENT, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
 from rest_framework.test import APITestCase
 
 from ..models import Ricetta, Ristorante, Ingrediente
@@ -173,3 +174,93 @@ class RicettaViewSetTestCase(APITestCase):
         self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
         self.assertEqual(response.status_code, HTTP_204_NO_CONTENT)
         self.assertEqual(Ricetta.objects.count(), 1) 
+
+    def test_update_ricetta_put_applica_differenza(self):
+        """
+        Testa che l'aggiornamento completo di una ricetta sostituisca gli ingredienti
+        applicando solo la differenza: gli ingredienti mantenuti restano collegati,
+        quelli nuovi vengono aggiunti e quelli assenti dalla richiesta rimossi, con
+        un solo segnale m2m_changed per operazione.
+        """
+        # Prepara gli ingredienti
+        basilico = Ingrediente.objects.create(nome='Basilico', produttore='Produttore Locale')
+        origano = Ingrediente.objects.create(nome='Origano', produttore='Produttore Locale')
+
+        segnali = []
+
+        def registra(sender, action, pk_set, **kwargs):
+            segnali.append((action, pk_set))
+
+        m2m_changed.connect(registra, sender=Ricetta.ingredienti.through)
+        self.addCleanup(m2m_changed.disconnect, registra, sender=Ricetta.ingredienti.through)
+
+        # Call
+        url = reverse('ricetta-detail', kwargs={'pk': 'Pizza Margherita'})
+        data = {'nome': 'Pizza Margherita',
+                'ingredienti': ['Pomodoro', basilico.pk, origano.pk]}
+        response = self.client.put(url, json.dumps(data), content_type='application/json')
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        ingredienti = set(Ricetta.objects.get(pk='Pizza Margherita').ingredienti.values_list('pk', flat=True))
+        self.assertEqual(ingredienti, {'Pomodoro', 'Basilico', 'Origano'})
+        self.assertEqual(segnali, [
+            ('pre_remove', {'Mozzarella'}),
+            ('post_remove', {'Mozzarella'}),
+            ('pre_add', {'Basilico', 'Origano'}),
+            ('post_add', {'Basilico', 'Origano'}),
+        ])
+
+    def test_aggiungi_ingredienti_ricetta(self):
+        """
+        Testa l'aggiunta di un singolo ingrediente tramite POST all'endpoint
+        'ricetta-ingredienti'. Verifica che la risposta sia HTTP 200 OK, che riporti solo
+        l'ingrediente effettivamente aggiunto e che gli altri collegamenti restino invariati.
+        """
+        # Prepara gli ingredienti
+        Ingrediente.objects.create(nome='Basilico', produttore='Produttore Locale')
+
+        # Call
+        url = reverse('ricetta-ingredienti', kwargs={'pk': 'Pizza Margherita'})
+        data = {'ingredienti': ['Basilico', 'Pomodoro']}
+        response = self.client.post(url, json.dumps(data), content_type='application/json')
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data['aggiunti'], ['Basilico'])
+        ingredienti = set(Ricetta.objects.get(pk='Pizza Margherita').ingredienti.values_list('pk', flat=True))
+        self.assertEqual(ingredienti, {'Pomodoro', 'Mozzarella', 'Basilico'})
+
+    def test_aggiungi_ingrediente_inesistente(self):
+        """
+        Testa che l'aggiunta di un ingrediente inesistente ritorni HTTP 400 Bad Request
+        senza modificare gli ingredienti della ricetta.
+        """
+        # Call
+        url = reverse('ricetta-ingredienti', kwargs={'pk': 'Pizza Margherita'})
+        data = {'ingredienti': ['Tartufo']}
+        response = self.client.post(url, json.dumps(data), content_type='application/json')
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        self.assertEqual(Ricetta.objects.get(pk='Pizza Margherita').ingredienti.count(), 2)
+
+    def test_rimuovi_ingredienti_ricetta(self):
+        """
+        Testa la rimozione di un ingrediente tramite DELETE all'endpoint 'ricetta-ingredienti'.
+        Verifica che la risposta sia HTTP 200 OK e che rimanga collegato solo l'altro ingrediente.
+        """
+        # Call
+        url = reverse('ricetta-ingredienti', kwargs={'pk': 'Pizza Margherita'})
+        data = {'ingredienti': ['Mozzarella']}
+        response = self.client.delete(url, json.dumps(data), content_type='application/json')
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data['rimossi'], ['Mozzarella'])
+        ingredienti = list(Ricetta.objects.get(pk='Pizza Margherita').ingredienti.values_list('pk', flat=True))
+        self.assertEqual(ingredienti, ['Pomodoro'])
@@ -1,10 +1,13 @@
 import sys
+import json
+from unittest import mock
 
 from django.urls import reverse
 
 from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_204_NO_CONTENT
 from rest_framework.test import APITestCase
 
+from .. import serializers
 from ..models import Ristorante, Ricetta, Ingrediente
 
 class RistoranteTestCase(APITestCase):
@@ -95,6 +98,23 @@ class RistoranteTestCase(APITestCase):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]['nome'], 'Da Mario')
 
+    def test_filter_by_indirizzo(self):
+        """
+        Testa il filtro dei ristoranti per indirizzo tramite l'endpoint 'ristorante-list'.
+        Controlla che, fornendo 'Via Milano 2' come parametro di query, si riceva una risposta
+        HTTP 200 OK, che la lunghezza dei dati restituiti sia 1, e che il nome del ristorante
+        nei dati sia 'La Pergola'.
+        """
+        # Call
+        url = reverse('ristorante-list') + '?indirizzo=Via Milano 2'
+        response = self.client.get(url)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['nome'], 'La Pergola')
+
     def test_create_ristorante(self):
         """
         Testa la creazione di un nuovo ristorante tramite POST all'endpoint 'ristorante-list'.
@@ -129,6 +149,27 @@ class RistoranteTestCase(APITestCase):
         ristorante_to_update.refresh_from_db()
         self.assertEqual(ristorante_to_update.indirizzo, 'Via Aggiornata 123')
 
+    def test_update_ristorante_put_atomico(self):
+        """
+        Testa che indirizzo e ricette di un ristorante vengano salvati nella stessa
+        transazione: se l'aggiornamento delle ricette fallisce, anche il nuovo
+        indirizzo viene annullato.
+        """
+        # Setup
+        url = reverse('ristorante-detail', kwargs={'pk': 'Da Mario'})
+        data = {'nome': 'Da Mario', 'indirizzo': 'Via Aggiornata 123',
+                'ricette': ['Insalata Caprese']}
+
+        # Call
+        with mock.patch.object(serializers, 'aggiorna_collegamenti', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.put(url, json.dumps(data), content_type='application/json')
+
+        # Check
+        ristorante = Ristorante.objects.get(pk='Da Mario')
+        self.assertEqual(ristorante.indirizzo, 'Via Roma 1')
+        self.assertEqual(list(ristorante.ricette.values_list('pk', flat=True)), ['Pizza Margherita'])
+
     def test_partial_update_ristorante_patch(self):
         """
         Testa l'aggiornamento parziale (PATCH) di un ristorante, focalizzandosi sull'indirizzo.
@@ -0,0 +1,180 @@
+import sys
+import json
+from unittest import mock
+
+from django.urls import reverse
+
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND, HTTP_503_SERVICE_UNAVAILABLE
+from rest_framework.test import APITestCase
+
+from ..models import Ricetta, Ingrediente
+from .. import similarita
+from ..similarita import IndiceSimilarita, azzera_indice, prepara_indice
+
+class SimilaritaTestCase(APITestCase):
+
+    @staticmethod
+    def print_results(test_case_name, response):
+        print('\n' + '*' * 50)
+        print(test_case_name)
+        print("Status:", response.status_code)
+        print("Data:", response.data)
+        print('*' * 50)
+
+    
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Configura il database di test con ricette che condividono parte degli ingredienti.
+
+        Ingredienti creati: Pomodoro, Mozzarella, Basilico, Origano, Tonno.
+        Ricette create: Pizza Margherita (Pomodoro, Mozzarella, Basilico),
+                        Insalata Caprese (Pomodoro, Mozzarella, Basilico, Origano),
+                        Pizza Marinara (Pomodoro, Origano),
+                        Insalata di Tonno (Tonno).
+        """
+        # Creazione ingredienti
+        for nome in ('Pomodoro', 'Mozzarella', 'Basilico', 'Origano', 'Tonno'):
+            Ingrediente.objects.create(nome=nome, produttore='Produttore Locale')
+
+        # Creazione ricette
+        Ricetta.objects.create(nome='Pizza Margherita').ingredienti.add('Pomodoro', 'Mozzarella', 'Basilico')
+        Ricetta.objects.create(nome='Insalata Caprese').ingredienti.add('Pomodoro', 'Mozzarella', 'Basilico', 'Origano')
+        Ricetta.objects.create(nome='Pizza Marinara').ingredienti.add('Pomodoro', 'Origano')
+        Ricetta.objects.create(nome='Insalata di Tonno').ingredienti.add('Tonno')
+
+    def setUp(self):
+        # L'indice e' per processo: va ricostruito sui dati di ciascun test. La
+        # costruzione avviene qui e non nel thread separato, che non vedrebbe i
+        # dati della transazione del test
+        azzera_indice()
+        prepara_indice()
+
+    def test_ricette_simili(self):
+        """
+        Testa che l'endpoint 'ricetta-simili' ritorni le ricette che condividono almeno
+        un ingrediente, ordinate per indice di Jaccard decrescente.
+        """
+        # Call
+        url = reverse('ricetta-simili', kwargs={'pk': 'Pizza Margherita'})
+        response = self.client.get(url)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data, [{'nome': 'Insalata Caprese', 'similarita': 0.75},
+                                         {'nome': 'Pizza Marinara', 'similarita': 0.25}])
+
+    def test_ricette_simili_k(self):
+        """
+        Testa che il parametro 'k' limiti il numero di ricette ritornate e che un valore
+        non valido venga rifiutato con HTTP 400 Bad Request.
+        """
+        # Call
+        url = reverse('ricetta-simili', kwargs={'pk': 'Pizza Margherita'})
+        response = self.client.get(url, {'k': 1})
+        response_non_valida = self.client.get(url, {'k': 'tanti'})
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual([ricetta['nome'] for ricetta in response.data], ['Insalata Caprese'])
+        self.assertEqual(response_non_valida.status_code, HTTP_400_BAD_REQUEST)
+
+    def test_ricette_simili_ricetta_inesistente(self):
+        """
+        Testa che una ricetta inesistente ritorni HTTP 404 Not Found.
+        """
+        # Call
+        url = reverse('ricetta-simili', kwargs={'pk': 'Lasagne'})
+        response = self.client.get(url)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_404_NOT_FOUND)
+
+    def test_abbinamenti_ingrediente(self):
+        """
+        Testa che l'endpoint 'ingrediente-abbinamenti' ritorni gli ingredienti presenti
+        nelle stesse ricette, ordinati per numero di ricette in comune.
+        """
+        # Call
+        url = reverse('ingrediente-abbinamenti', kwargs={'pk': 'Origano'})
+        response = self.client.get(url)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data, [{'nome': 'Pomodoro', 'ricette': 2},
+                                         {'nome': 'Basilico', 'ricette': 1},
+                                         {'nome': 'Mozzarella', 'ricette': 1}])
+
+    def test_indice_in_costruzione(self):
+        """
+        Testa che, finche' l'indice non e' costruito, gli endpoint rispondano 503
+        con Retry-After e avviino la costruzione una sola volta, senza eseguirla
+        durante la richiesta.
+        """
+        # Setup
+        azzera_indice()
+
+        # Call
+        with mock.patch.object(similarita, '_costruisci_in_background') as costruisci:
+            response = self.client.get(reverse('ricetta-simili', kwargs={'pk': 'Pizza Margherita'}))
+            seconda = self.client.get(reverse('ingrediente-abbinamenti', kwargs={'pk': 'Origano'}))
+            similarita._costruzione.join()
+        similarita._costruzione = None
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertEqual(seconda.status_code, HTTP_503_SERVICE_UNAVAILABLE)
+        costruisci.assert_called_once_with()
+
+    def test_indice_aggiornato_dopo_modifiche(self):
+        """
+        Testa che l'indice, gia' costruito, rifletta le modifiche successive: un
+        ingrediente aggiunto tramite 'ricetta-ingredienti' e una ricetta eliminata.
+        """
+        # Costruisce l'indice
+        url = reverse('ricetta-simili', kwargs={'pk': 'Insalata di Tonno'})
+        self.assertEqual(self.client.get(url).data, [])
+
+        # Prepara le modifiche
+        self.client.post(reverse('ricetta-ingredienti', kwargs={'pk': 'Insalata di Tonno'}),
+                         json.dumps({'ingredienti': ['Pomodoro']}), content_type='application/json')
+        Ricetta.objects.get(pk='Pizza Marinara').delete()
+
+        # Call
+        response = self.client.get(url)
+
+        # Check
+        self.print_results(test_case_name=sys._getframe().f_code.co_name, response=response)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual([ricetta['nome'] for ricetta in response.data], ['Pizza Margherita', 'Insalata Caprese'])
+
+    def test_interrogazioni_con_indice_bloccato(self):
+        """
+        Testa che le interrogazioni vengano eseguite tenendo il lucchetto
+        dell'indice: un aggiornamento concorrente modificherebbe gli insiemi
+        mentre vengono scorsi.
+        """
+        # Setup
+        bloccato = []
+        simili, abbinamenti = IndiceSimilarita.simili, IndiceSimilarita.abbinamenti
+
+        def verifica(metodo):
+            def interroga(indice, *argomenti):
+                bloccato.append(similarita._lucchetto.locked())
+                return metodo(indice, *argomenti)
+            return interroga
+
+        # Call
+        with mock.patch.object(IndiceSimilarita, 'simili', verifica(simili)), \
+             mock.patch.object(IndiceSimilarita, 'abbinamenti', verifica(abbinamenti)):
+            self.client.get(reverse('ricetta-simili', kwargs={'pk': 'Pizza Margherita'}))
+            self.client.get(reverse('ingrediente-abbinamenti', kwargs={'pk': 'Origano'}))
+
+        # Check
+        self.assertEqual(bloccato, [True, True])
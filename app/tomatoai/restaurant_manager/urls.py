@@ -1,12 +1,23 @@
+from django.conf import settings
 from django.urls import path, include
 
-from .views import RistoranteViewSet, RicettaViewSet, IngredienteViewSet
-from rest_framework.routers import DefaultRouter
+from .views import RistoranteViewSet, RicettaViewSet, IngredienteViewSet, LavoroViewSet, ModificaViewSet, AnalisiViewSet
+from rest_framework.routers import DefaultRouter, SimpleRouter
+
+# La vista radice navigabile e i suffissi di formato (.json, .api) servono solo a chi
+# esplora l'API dal browser: i profili API-only usano il SimpleRouter, che registra
+# la meta' dei pattern e non ha la vista radice.
+if getattr(settings, 'RESTAURANT_MANAGER_API_ROOT', True):
+    router = DefaultRouter()
+else:
+    router = SimpleRouter()
 
-router = DefaultRouter()
 router.register(r'ristoranti', RistoranteViewSet)
 router.register(r'ricette', RicettaViewSet)
 router.register(r'ingredienti', IngredienteViewSet)
+router.register(r'lavori', LavoroViewSet)
+router.register(r'changes', ModificaViewSet, basename='modifica')
+router.register(r'analytics', AnalisiViewSet, basename='analisi')
 
 urlpatterns = [
     path(r'', include(router.get_urls())),
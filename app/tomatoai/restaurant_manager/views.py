@@ -1,71 +1,287 @@
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.mixins import CreateModelMixin, ListModelMixin, RetrieveModelMixin
+from rest_framework.response import Response
+from rest_framework.status import HTTP_202_ACCEPTED, HTTP_503_SERVICE_UNAVAILABLE
+from rest_framework.viewsets import GenericViewSet, ModelViewSet, ViewSet
 
-from .models import Ristorante, Ricetta, Ingrediente
-from .serializers import RistoranteSerializer, RicettaSerializer, IngredienteSerializer
+from .analisi import ClassificheNonPronte, classifiche
+from .collegamenti import aggiungi_collegamenti, rimuovi_collegamenti
+from .istantanee import FiltroNonSupportato, ottieni_istantanea
+from .limiti import CostoThrottle
+from .modifiche import modifiche_dal
+from .models import Ristorante, Ricetta, Ingrediente, Lavoro
+from .serializers import RistoranteSerializer, RicettaSerializer, IngredienteSerializer, CollegamentiIngredientiSerializer, LavoroSerializer
+from .similarita import IndiceNonPronto, ingredienti_abbinati, ricette_simili
 
-class RistoranteViewSet(ModelViewSet):
-    queryset = Ristorante.objects.all()
-    serializer_class = RistoranteSerializer
+def _parametro_k(request, predefinito=10, massimo=100):
+    try:
+        k = int(request.query_params.get('k', predefinito))
+    except ValueError:
+        raise ValidationError('Il parametro "k" deve essere un numero intero.')
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        nome_ristorante = self.request.query_params.get('nome_ristorante', None)
-        nome_ricetta = self.request.query_params.get('nome_ricetta', None)
+    if k < 1:
+        raise ValidationError('Il parametro "k" deve essere positivo.')
+    return min(k, massimo)
+
+
+# Secondi dopo i quali riprovare mentre le strutture in memoria del processo
+# (indice di similarita', classifiche) sono in costruzione
+ATTESA_COSTRUZIONE = 2
+
+
+def _in_costruzione(cosa):
+    return Response({'detail': f'{cosa} in costruzione, riprovare a breve.'},
+                    status=HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': str(ATTESA_COSTRUZIONE)})
 
+
+class FiltriMixin:
+    """
+    Filtra il queryset con i parametri della query string elencati in `filtri`
+    (parametro -> lookup). I parametri assenti o vuoti vengono ignorati.
+
+    La tabella dichiarativa permette a `manage.py spiega_query` di analizzare
+    ogni combinazione di filtri che le viste possono produrre.
+    """
+    filtri = {}
+
+    @classmethod
+    def filtra(cls, queryset, parametri):
         filter_dict = {}
 
-        if nome_ristorante:
-            filter_dict['nome'] = nome_ristorante
-        if nome_ricetta:
-            filter_dict['ricette__nome'] = nome_ricetta
+        for parametro, lookup in cls.filtri.items():
+            valore = parametri.get(parametro, None)
+            if valore:
+                filter_dict[lookup] = valore
 
         queryset = queryset.filter(**filter_dict)
-
+        # I filtri sulle relazioni ManyToMany ripetono l'oggetto per ogni riga collegata
+        if any('__' in lookup for lookup in filter_dict):
+            queryset = queryset.distinct()
         return queryset
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        return self.filtra(queryset, self.request.query_params)
+
+
+class LimitiMixin:
+    """
+    Limita le richieste di ciascun client in base al loro costo stimato, con il
+    limite configurato per il `throttle_scope` della vista in RESTAURANT_MANAGER_LIMITI
+    (vedi limiti.py). Le risposte riportano il budget del client nelle intestazioni
+    X-RateLimit-*, quelle rifiutate (429) anche Retry-After.
+    """
+    throttle_classes = [CostoThrottle]
+    intestazioni_limite = None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        for intestazione, valore in (self.intestazioni_limite or {}).items():
+            response[intestazione] = valore
+        return response
+
+
+class IstantaneaMixin:
+    """
+    Serve la lista dall'istantanea pubblicata del catalogo (vedi istantanee.py),
+    senza interrogare il database, quando RESTAURANT_MANAGER_ISTANTANEA e'
+    configurata. Gli oggetti sono ordinati per nome e senza ripetizioni, come
+    quelli letti dal database, e riflettono il catalogo al momento della
+    pubblicazione: la versione e' nell'intestazione X-Catalog-Snapshot ed e' il
+    cursore da cui leggere le modifiche successive da /changes/.
+
+    Senza istantanea, o con filtri che l'istantanea non sa valutare, la lista
+    viene servita dal database.
+    """
+
+    def list(self, request, *args, **kwargs):
+        istantanea = ottieni_istantanea()
+        if istantanea is None:
+            return super().list(request, *args, **kwargs)
+
+        try:
+            oggetti = istantanea.elenco(self.queryset.model._meta.model_name, self.filtri, request.query_params)
+        except FiltroNonSupportato:
+            return super().list(request, *args, **kwargs)
+
+        pagina = self.paginate_queryset(oggetti)
+        if pagina is not None:
+            response = self.get_paginated_response(pagina)
+        else:
+            response = Response(oggetti)
+        response['X-Catalog-Snapshot'] = str(istantanea.versione)
+        return response
+
+
+class RistoranteViewSet(LimitiMixin, IstantaneaMixin, FiltriMixin, ModelViewSet):
+    queryset = Ristorante.objects.all().order_by('pk')
+    serializer_class = RistoranteSerializer
+    throttle_scope = 'ristoranti'
+    filtri = {
+        'nome_ristorante': 'nome',
+        'nome_ricetta': 'ricette__nome',
+        'indirizzo': 'indirizzo',
+    }
     
 
-class RicettaViewSet(ModelViewSet):
+
+class RicettaViewSet(LimitiMixin, IstantaneaMixin, FiltriMixin, ModelViewSet):
     serializer_class = RicettaSerializer
-    queryset = Ricetta.objects.all()
+    queryset = Ricetta.objects.all().order_by('pk')
+    throttle_scope = 'ricette'
+    filtri = {
+        'nome_ricetta': 'nome',
+        'nome_ristorante': 'ristoranti__nome',
+        'nome_ingrediente': 'ingredienti__nome',
+    }
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        nome_ristorante = self.request.query_params.get('nome_ristorante', None)
-        nome_ricetta = self.request.query_params.get('nome_ricetta', None)
-        nome_ingrediente = self.request.query_params.get('nome_ingrediente', None)
+    @action(detail=True, methods=['post', 'delete'], url_path='ingredienti')
+    def ingredienti(self, request, pk=None):
+        """
+        Aggiunge (POST) o rimuove (DELETE) singoli ingredienti dalla ricetta senza
+        dover reinviare l'elenco completo. Ritorna gli ingredienti modificati.
+        """
+        ricetta = self.get_object()
 
-        filter_dict = {}
+        serializer = CollegamentiIngredientiSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        richiesti = set(serializer.validated_data['ingredienti'])
 
-        if nome_ricetta:
-            filter_dict['nome'] = nome_ricetta
-        if nome_ristorante:
-            filter_dict['ristoranti__nome'] = nome_ristorante
-        if nome_ingrediente:
-            filter_dict['ingredienti__nome'] = nome_ingrediente
+        if request.method == 'POST':
+            esistenti = set(Ingrediente.objects.filter(pk__in=richiesti).values_list('pk', flat=True))
+            mancanti = richiesti - esistenti
+            if mancanti:
+                raise ValidationError({'ingredienti': [f'Ingrediente "{nome}" inesistente.' for nome in sorted(mancanti)]})
 
-        queryset = queryset.filter(**filter_dict)
+            modificati = aggiungi_collegamenti(ricetta, 'ingredienti', richiesti)
+            return Response({'aggiunti': sorted(modificati)})
 
-        return queryset
+        modificati = rimuovi_collegamenti(ricetta, 'ingredienti', richiesti)
+        return Response({'rimossi': sorted(modificati)})
 
-class IngredienteViewSet(ModelViewSet):
+    @action(detail=True, methods=['get'])
+    def simili(self, request, pk=None):
+        """
+        Ritorna le k ricette piu' simili (?k=, predefinito 10) secondo l'indice di
+        Jaccard sugli ingredienti. Finche' l'indice del processo e' in costruzione
+        risponde 503 con Retry-After.
+        """
+        ricetta = self.get_object()
+        k = _parametro_k(request)
+
+        try:
+            simili = ricette_simili(ricetta.pk, k)
+        except IndiceNonPronto:
+            return _in_costruzione('Indice di similarita\'')
+        return Response([{'nome': nome, 'similarita': round(similarita, 4)} for nome, similarita in simili])
+
+class IngredienteViewSet(LimitiMixin, IstantaneaMixin, FiltriMixin, ModelViewSet):
     serializer_class = IngredienteSerializer
-    queryset = Ingrediente.objects.all()
+    queryset = Ingrediente.objects.all().order_by('pk')
+    throttle_scope = 'ingredienti'
+    filtri = {
+        'nome_ingrediente': 'nome',
+        'nome_ricetta': 'ricette__nome',
+        'nome_ristorante': 'ricette__ristoranti__nome',
+        'produttore': 'produttore',
+    }
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        nome_ristorante = self.request.query_params.get('nome_ristorante', None)
-        nome_ricetta = self.request.query_params.get('nome_ricetta', None)
-        nome_ingrediente = self.request.query_params.get('nome_ingrediente', None)
+    @action(detail=True, methods=['get'])
+    def abbinamenti(self, request, pk=None):
+        """
+        Ritorna i k ingredienti (?k=, predefinito 10) che compaiono piu' spesso nelle
+        stesse ricette dell'ingrediente, candidati come sostituti o abbinamenti.
+        Finche' l'indice del processo e' in costruzione risponde 503 con Retry-After.
+        """
+        ingrediente = self.get_object()
+        k = _parametro_k(request)
 
-        filter_dict = {}
+        try:
+            abbinamenti = ingredienti_abbinati(ingrediente.pk, k)
+        except IndiceNonPronto:
+            return _in_costruzione('Indice di similarita\'')
+        return Response([{'nome': nome, 'ricette': ricette} for nome, ricette in abbinamenti])
 
-        if nome_ingrediente:
-            filter_dict['nome'] = nome_ingrediente
-        if nome_ricetta:
-            filter_dict['ricette__nome'] = nome_ricetta
-        if nome_ristorante:
-            filter_dict['ricette__ristoranti__nome'] = nome_ristorante
+class LavoroViewSet(LimitiMixin, FiltriMixin, CreateModelMixin, ListModelMixin, RetrieveModelMixin, GenericViewSet):
+    """
+    Accoda lavori pesanti (POST) e ne riporta lo stato di avanzamento (GET).
+    I lavori vengono eseguiti da `manage.py esegui_lavori`.
+    """
+    serializer_class = LavoroSerializer
+    queryset = Lavoro.objects.all().order_by('-pk')
+    throttle_scope = 'lavori'
+    filtri = {
+        'tipo': 'tipo',
+        'stato': 'stato',
+    }
 
-        queryset = queryset.filter(**filter_dict)
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = HTTP_202_ACCEPTED
+        return response
+
+
+class ModificaViewSet(LimitiMixin, ViewSet):
+    """
+    Feed incrementale delle modifiche per le cache dei client.
+
+    GET ?since=<cursore>&limit=<n> ritorna le modifiche successive al cursore,
+    compattate per chiave all'interno della pagina, e il cursore da usare nella
+    richiesta successiva. Quando 'altre' e' vero il client deve continuare a
+    leggere; una chiave puo' comparire in piu' pagine e vale l'ultima.
+    """
+    throttle_scope = 'changes'
+    LIMITE_PREDEFINITO = 500
+    LIMITE_MASSIMO = 5000
+
+    def list(self, request):
+        try:
+            cursore = int(request.query_params.get('since', 0))
+            limite = int(request.query_params.get('limit', self.LIMITE_PREDEFINITO))
+        except ValueError:
+            raise ValidationError('I parametri "since" e "limit" devono essere numeri interi.')
+
+        if cursore < 0 or limite < 1:
+            raise ValidationError('I parametri "since" e "limit" devono essere positivi.')
+        limite = min(limite, self.LIMITE_MASSIMO)
+
+        modifiche, nuovo_cursore, altre = modifiche_dal(cursore, limite)
+
+        return Response({
+            'cursore': nuovo_cursore,
+            'altre': altre,
+            'modifiche': modifiche,
+        })
+
+
+class AnalisiViewSet(LimitiMixin, ViewSet):
+    """
+    Classifiche del catalogo, mantenute in memoria e aggiornate dal feed delle
+    modifiche (vedi analisi.py): la risposta non scorre le tabelle dei collegamenti.
+
+    GET ?k=<n> (predefinito 50) ritorna gli ingredienti usati dal maggior numero di
+    ristoranti, i produttori i cui ingredienti raggiungono piu' ristoranti e i
+    ristoranti con il menu piu' ampio, aggiornati al cursore riportato.
+
+    Finche' le classifiche del processo sono in costruzione risponde 503 con
+    Retry-After.
+    """
+    throttle_scope = 'analytics'
+
+    def list(self, request):
+        k = _parametro_k(request, predefinito=50, massimo=1000)
+
+        try:
+            cursore, ingredienti, produttori, ristoranti = classifiche(k)
+        except ClassificheNonPronte:
+            return _in_costruzione('Classifiche')
 
-        return queryset
\ No newline at end of file
+        return Response({
+            'cursore': cursore,
+            'ingredienti': [{'nome': nome, 'ristoranti': numero} for nome, numero in ingredienti],
+            'produttori': [{'produttore': produttore, 'ristoranti': numero} for produttore, numero in produttori],
+            'ristoranti': [{'nome': nome, 'ricette': numero} for nome, numero in ristoranti],
+        })
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -122,3 +123,29 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Per-client request budgets of the restaurant_manager API, by viewset
+# (throttle_scope). Each client has a bucket of up to 'capacita' tokens refilled
+# at 'ricarica' tokens per second, and every request spends its estimated cost:
+# unfiltered lists of large tables cost more than lookups by name. See
+# restaurant_manager/limiti.py for the other options and their defaults.
+# Buckets live in the RESTAURANT_MANAGER_LIMITI_CACHE cache, which must be shared
+# by all workers (e.g. Redis or Memcached) for the limits to be global.
+
+RESTAURANT_MANAGER_LIMITI = {
+    'ristoranti': {'capacita': 600, 'ricarica': 10},
+    'ricette': {'capacita': 600, 'ricarica': 10},
+    'ingredienti': {'capacita': 600, 'ricarica': 10},
+    'lavori': {'capacita': 60, 'ricarica': 1},
+    'changes': {'capacita': 1200, 'ricarica': 20},
+    'analytics': {'capacita': 120, 'ricarica': 2},
+}
+
+# DJANGO_RATE_LIMITS=off disables all budgets. The profiling and benchmark
+# commands set it for the processes they measure, which would otherwise mostly
+# serve 429 responses after the first few hundred requests.
+if os.environ.get('DJANGO_RATE_LIMITS') == 'off':
+    RESTAURANT_MANAGER_LIMITI = {}
+
+RESTAURANT_MANAGER_LIMITI_CACHE = 'default'
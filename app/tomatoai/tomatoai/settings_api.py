@@ -0,0 +1,46 @@
+"""
+Django settings for tomatoai project, API-only profile.
+
+Used on the hosts that only serve /restaurant_manager/: sessions, messages,
+CSRF, clickjacking and auth middleware, the admin and the template engines
+are not loaded, and DRF renders JSON only. The admin keeps running on the
+hosts configured with tomatoai.settings_prod.
+
+Compare the two profiles with `manage.py misura_profili` and inspect the
+import cost of each with `manage.py profila_avvio --profilo <settings>`.
+"""
+
+from .settings_prod import *  # noqa: F401,F403
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'restaurant_manager.apps.RestaurantManagerConfig'
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'tomatoai.urls_api'
+
+# No browsable API root and no format suffix patterns (see restaurant_manager.urls)
+RESTAURANT_MANAGER_API_ROOT = False
+
+TEMPLATES = []
+
+AUTH_PASSWORD_VALIDATORS = []
+
+
+# Django REST framework
+# The API does not use authentication: without django.contrib.auth there is
+# no anonymous user to attach to the request.
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+    'UNAUTHENTICATED_USER': None,
+    'NUM_PROXIES': REST_FRAMEWORK['NUM_PROXIES'],  # noqa: F405
+}
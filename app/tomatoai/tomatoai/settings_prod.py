@@ -0,0 +1,71 @@
+"""
+Django settings for tomatoai project, production runtime profile.
+
+Extends the development settings for use behind a multi-process WSGI/ASGI
+server (see gunicorn.conf.py): DEBUG is off, so queries are no longer
+recorded in memory, and database connections are kept open across requests.
+
+All values can be overridden through environment variables.
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES, SECRET_KEY
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)
+
+DEBUG = False
+
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
+
+
+# Database
+# Persistent connections: each worker reuses its connection for up to
+# CONN_MAX_AGE seconds instead of reconnecting on every request.
+# https://docs.djangoproject.com/en/5.0/ref/databases/#persistent-connections
+
+DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DJANGO_CONN_MAX_AGE', 600))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+
+# Cache
+# Shared by all workers, it holds the per-client request budgets
+# (RESTAURANT_MANAGER_LIMITI). Without a location each worker keeps its own
+# in-memory cache and the budgets are per process.
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+if os.environ.get('DJANGO_CACHE_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.redis.RedisCache'),
+            'LOCATION': os.environ['DJANGO_CACHE_LOCATION'],
+        }
+    }
+
+
+# Django REST framework
+# Number of reverse proxies in front of the application. Clients are throttled
+# by the address the outermost proxy saw, i.e. the entry that many positions
+# from the end of X-Forwarded-For; with 0 the header is ignored and
+# REMOTE_ADDR is used. Never leave it unset: DRF would then trust whatever the
+# client puts in the header, and each request could pick a fresh budget.
+# https://www.django-rest-framework.org/api-guide/throttling/#how-clients-are-identified
+
+REST_FRAMEWORK = {
+    'NUM_PROXIES': int(os.environ.get('DJANGO_NUM_PROXIES', 0)),
+}
+
+
+# Static files are served by the reverse proxy after `manage.py collectstatic`
+
+STATIC_ROOT = os.environ.get('DJANGO_STATIC_ROOT', BASE_DIR / 'staticfiles')
+
+
+# Catalog snapshot
+# When set, the restaurant/recipe/ingredient lists are served from the snapshot
+# published at this path by `manage.py pubblica_catalogo` (or the
+# 'pubblica_catalogo' job) instead of the database. Every worker maps the same
+# file, so the catalog is held once in the page cache.
+
+RESTAURANT_MANAGER_ISTANTANEA = os.environ.get('DJANGO_CATALOG_SNAPSHOT') or None
@@ -0,0 +1,10 @@
+"""
+URL configuration for the API-only profile (tomatoai.settings_api).
+
+Same routes as tomatoai.urls, without the admin.
+"""
+from django.urls import include, path
+
+urlpatterns = [
+    path('restaurant_manager/', include('restaurant_manager.urls'))
+]
@@ -0,0 +1,14 @@
+docker stop tomatoai-django-demo-prod
+
+# GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker per servire l'applicazione ASGI
+docker run --rm -d \
+    --name tomatoai-django-demo-prod \
+    -v ./app:/app \
+    -w /app/tomatoai \
+    -p 8000:8000 \
+    -e GUNICORN_WORKER_CLASS=${GUNICORN_WORKER_CLASS:-sync} \
+    -e DJANGO_SECRET_KEY \
+    -e DJANGO_ALLOWED_HOSTS \
+    -e DJANGO_NUM_PROXIES \
+    tomatoai-django-demo \
+    gunicorn -c gunicorn.conf.py
\ No newline at end of file